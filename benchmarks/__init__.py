@@ -0,0 +1,14 @@
+"""Offline benchmarks for the e-commerce API.
+
+Scripts in this package run against a throwaway SQLite database configured
+by ``benchmarks.settings``; see each module for usage.
+"""
+import os
+
+
+def setup(settings_module='benchmarks.settings'):
+    """Configure Django for a benchmark script"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    django.setup()
@@ -0,0 +1,74 @@
+"""Show query plans for the catalog and order access paths before and after
+the composite index migrations.
+
+Usage::
+
+    python -m benchmarks.explain_indexes [--products 20000] [--orders 20000]
+"""
+import argparse
+
+from benchmarks import setup
+
+
+# Migration states to compare: without and with the access path indexes
+BEFORE = [('products', '0001_initial'), ('orders', '0002_initial')]
+AFTER = [('products', '0002_product_access_path_indexes'), ('orders', '0003_order_access_path_indexes')]
+
+
+def access_paths():
+    """Querysets shaped like the ones ProductViewSet and OrderViewSet issue"""
+    from orders.models import Order
+    from products.models import Category, Product
+
+    category = Category.objects.order_by('id').first()
+    user_id = Order.objects.values_list('user_id', flat=True).first()
+    return {
+        'category + price range, ordered by price': Product.objects.filter(
+            category=category, price__gte=10, price__lte=200).order_by('price', 'id')[:10],
+        'in stock, ordered by name': Product.objects.filter(
+            category=category, stock__gt=0).order_by('name')[:10],
+        'newest products': Product.objects.order_by('-created_at', '-id')[:10],
+        'order history for one user': Order.objects.filter(user_id=user_id)[:10],
+        'staff order list': Order.objects.all()[:10],
+    }
+
+
+def migrate_to(targets):
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(targets)
+
+
+def explain_all():
+    return {name: queryset.explain() for name, queryset in access_paths().items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup()
+    from django.core.management import call_command
+    from benchmarks.seed import seed_catalog, seed_orders
+
+    call_command('migrate', verbosity=0)
+    migrate_to(BEFORE)
+    seed_catalog(products=args.products)
+    seed_orders(users=max(args.orders // 10, 1), orders=args.orders)
+
+    before = explain_all()
+    migrate_to(AFTER)
+    after = explain_all()
+
+    for name in before:
+        print(f'== {name}')
+        print(f'-- before\n{before[name]}')
+        print(f'-- after\n{after[name]}\n')
+
+
+if __name__ == '__main__':
+    main()
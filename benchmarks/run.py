@@ -0,0 +1,143 @@
+"""Benchmark runner.
+
+Seed a reusable dataset once, then run scenarios against it and compare
+the JSON output across commits::
+
+    export BENCHMARK_DB=/tmp/bench.sqlite3
+    python -m benchmarks.run seed --products 100000 --users 10000 --orders 100000
+    python -m benchmarks.run bench --iterations 200 --output bench.json
+    python -m benchmarks.run bench --scenario browse --scenario search --cold
+
+Everything runs offline on SQLite, the local-memory cache and the in-memory
+channel layer (see ``benchmarks.settings``).
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks import setup
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies, units_per_op=1):
+    from metrics.recorder import percentile
+
+    elapsed = sum(latencies)
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'ops': len(latencies),
+        'seconds': round(elapsed, 4),
+        'throughput_per_s': round(len(latencies) * units_per_op / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(milliseconds, 0.50), 3),
+        'p95_ms': round(percentile(milliseconds, 0.95), 3),
+        'p99_ms': round(percentile(milliseconds, 0.99), 3),
+        'max_ms': round(max(milliseconds), 3),
+    }
+
+
+def dataset():
+    from django.contrib.auth import get_user_model
+    from orders.models import Order, OrderItem
+    from products.models import Product
+
+    return {
+        'products': Product.objects.count(),
+        'users': get_user_model().objects.count(),
+        'orders': Order.objects.count(),
+        'order_items': OrderItem.objects.count(),
+    }
+
+
+def add_seed_arguments(parser):
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--categories', type=int, default=20)
+
+
+def run_seed(args):
+    from benchmarks.seed import seed
+    return seed(
+        products=args.products, users=args.users, orders=args.orders,
+        items_per_order=args.items_per_order, categories=args.categories,
+    )
+
+
+def run_bench(args):
+    from benchmarks import scenarios
+
+    if not dataset()['products']:
+        run_seed(args)
+
+    scenarios.COLD_CACHE = args.cold
+    names = args.scenario or list(scenarios.SCENARIOS)
+    results = {}
+    for name in names:
+        scenario = scenarios.SCENARIOS[name]
+        rng = random.Random(args.seed)
+        if name == 'ws_fanout':
+            latencies = scenario(args.iterations, rng, connections=args.connections)
+            results[name] = summarize(latencies)
+            results[name]['messages_per_s'] = summarize(latencies, args.connections)['throughput_per_s']
+        else:
+            results[name] = summarize(scenario(args.iterations, rng))
+
+    import django
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'cold_cache': args.cold,
+        'dataset': dataset(),
+        'scenarios': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the e-commerce API')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help='Populate the benchmark database')
+    add_seed_arguments(seed_parser)
+
+    bench_parser = subparsers.add_parser('bench', help='Run benchmark scenarios')
+    add_seed_arguments(bench_parser)
+    bench_parser.add_argument('--scenario', action='append',
+                              choices=['browse', 'search', 'filter', 'cart_add', 'checkout', 'ws_fanout'],
+                              help='Scenario to run (repeatable; default: all)')
+    bench_parser.add_argument('--iterations', type=int, default=100)
+    bench_parser.add_argument('--connections', type=int, default=200, help='WebSocket clients for ws_fanout')
+    bench_parser.add_argument('--cold', action='store_true', help='Clear the cache before every operation')
+    bench_parser.add_argument('--seed', type=int, default=0, help='Random seed for request parameters')
+    bench_parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    args = parser.parse_args(argv)
+    setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    result = run_seed(args) if args.command == 'seed' else run_bench(args)
+    report = json.dumps(result, indent=2)
+    if getattr(args, 'output', None):
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        sys.stdout.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Benchmark scenarios.
+
+Each scenario takes the number of iterations and a seeded ``random.Random``
+and returns one latency (in seconds) per operation. Requests go through the
+full Django/DRF stack in-process via the test client, so no server is needed.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from orders.models import Cart
+from products.models import Category, Product
+
+User = get_user_model()
+
+# Set by the runner: clear caches before every operation
+COLD_CACHE = False
+
+
+def _measure(operation, iterations, setup=None):
+    latencies = []
+    for index in range(iterations):
+        if setup is not None:
+            setup(index)
+        if COLD_CACHE:
+            cache.clear()
+        start = time.perf_counter()
+        operation(index)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _check(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request["PATH_INFO"]}: HTTP {response.status_code} {response.content[:200]!r}')
+    return response
+
+
+def browse(iterations, rng):
+    """Anonymous product listing pages"""
+    client = APIClient()
+    pages = max(Product.objects.count() // 10, 1)
+    return _measure(lambda index: _check(client.get('/api/products/', {'page': rng.randint(1, min(pages, 100))})),
+                    iterations)
+
+
+def search(iterations, rng):
+    """Full-text search with prefix terms"""
+    client = APIClient()
+    terms = ['product', 'description', 'category'] + [f'{digit:04d}' for digit in range(100)]
+    return _measure(lambda index: _check(client.get('/api/products/', {'search': rng.choice(terms)})), iterations)
+
+
+def filter_products(iterations, rng):
+    """ProductFilter and ordering combinations"""
+    client = APIClient()
+    slugs = list(Category.objects.values_list('slug', flat=True))
+    orderings = ['name', '-price', 'price', '-created_at']
+
+    def operation(index):
+        low = rng.randint(1, 500)
+        _check(client.get('/api/products/', {
+            'category': rng.choice(slugs),
+            'min_price': low,
+            'max_price': low + rng.randint(10, 500),
+            'in_stock': 'true',
+            'ordering': rng.choice(orderings),
+        }))
+    return _measure(operation, iterations)
+
+
+def _restock():
+    Product.objects.update(stock=1_000_000)
+
+
+def _product_ids():
+    return list(Product.objects.values_list('id', flat=True)[:10000])
+
+
+def cart_add(iterations, rng):
+    """CartItemViewSet.create ("+1 quantity" clicks)"""
+    _restock()
+    users = list(User.objects.order_by('id')[:100])
+    product_ids = _product_ids()
+    client = APIClient()
+
+    def operation(index):
+        client.force_authenticate(users[index % len(users)])
+        _check(client.post('/api/orders/cart-items/', {'product_id': rng.choice(product_ids), 'quantity': 1}), 201)
+    return _measure(operation, iterations)
+
+
+def checkout(iterations, rng, lines=3):
+    """CreateOrderSerializer checkout of a pre-filled cart"""
+    _restock()
+    users = list(User.objects.order_by('-id')[:iterations])
+    product_ids = _product_ids()
+    client = APIClient()
+
+    def fill_cart(index):
+        client.force_authenticate(users[index % len(users)])
+        Cart.objects.filter(user=users[index % len(users)]).delete()
+        for product_id in rng.sample(product_ids, lines):
+            _check(client.post('/api/orders/cart-items/', {'product_id': product_id, 'quantity': 1}), 201)
+
+    def operation(index):
+        _check(client.post('/api/orders/orders/', {'shipping_address': '1 Benchmark Street', 'phone': '555-0100'}), 201)
+    return _measure(operation, iterations, setup=fill_cart)
+
+
+def ws_fanout(iterations, rng, connections=200):
+    """Order notifications delivered to ``connections`` WebSocket clients"""
+    return asyncio.run(_ws_fanout(iterations, connections))
+
+
+async def _ws_fanout(iterations, connections):
+    from channels.layers import get_channel_layer
+    from channels.testing import WebsocketCommunicator
+    from notifications.consumers import OrderNotificationConsumer
+
+    application = OrderNotificationConsumer.as_asgi()
+    communicators = []
+    for user_id in range(1, connections + 1):
+        communicator = WebsocketCommunicator(application, '/ws/notifications/')
+        communicator.scope['user'] = SimpleNamespace(id=user_id, pk=user_id, is_anonymous=False)
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('WebSocket connection refused')
+        communicators.append((user_id, communicator))
+
+    channel_layer = get_channel_layer()
+    latencies = []
+    try:
+        for index in range(iterations):
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                channel_layer.group_send(f'user_{user_id}', {
+                    'type': 'order_notification',
+                    'message': {'order_id': index, 'status': 'shipped', 'message': 'Benchmark'},
+                })
+                for user_id, _ in communicators
+            ))
+            await asyncio.gather(*(communicator.receive_from() for _, communicator in communicators))
+            latencies.append(time.perf_counter() - start)
+    finally:
+        for _, communicator in communicators:
+            await communicator.disconnect()
+    return latencies
+
+
+SCENARIOS = {
+    'browse': browse,
+    'search': search,
+    'filter': filter_products,
+    'cart_add': cart_add,
+    'checkout': checkout,
+    'ws_fanout': ws_fanout,
+}
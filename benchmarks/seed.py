@@ -0,0 +1,121 @@
+"""Fast synthetic data generation using bulk_create.
+
+Run through ``python -m benchmarks.run seed``, e.g. for ~1M products, 100k
+users and ~5M order items::
+
+    BENCHMARK_DB=/tmp/bench.sqlite3 python -m benchmarks.run seed \
+        --products 1000000 --users 100000 --orders 1700000 --items-per-order 3
+"""
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from products.search import get_search_backend
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+def _batched(factory, total, batch_size=BATCH_SIZE):
+    """Yield lists of at most ``batch_size`` objects built by ``factory(index)``"""
+    for start in range(0, total, batch_size):
+        yield [factory(index) for index in range(start, min(start + batch_size, total))]
+
+
+@transaction.atomic
+def seed_catalog(categories=20, products=10000, seed=0):
+    """Create ``categories`` categories and ``products`` products"""
+    rng = random.Random(seed)
+    category_objs = Category.objects.bulk_create(
+        Category(name=f'Category {index}', slug=f'category-{index}', description='')
+        for index in range(categories)
+    )
+
+    def product(index):
+        return Product(
+            name=f'Product {index:08d}',
+            slug=f'product-{index}',
+            description=f'Description of product {index}',
+            price=Decimal(rng.randrange(100, 100000)) / 100,
+            # Roughly one product in ten is out of stock
+            stock=0 if rng.random() < 0.1 else rng.randrange(1, 500),
+            category=rng.choice(category_objs),
+        )
+
+    for batch in _batched(product, products):
+        Product.objects.bulk_create(batch)
+
+    # bulk_create bypasses Product.save(), so index the catalog in one pass
+    backend = get_search_backend()
+    if backend is not None:
+        backend.rebuild()
+    return category_objs
+
+
+@transaction.atomic
+def seed_orders(users=1000, orders=10000, items_per_order=3, seed=0):
+    """Create ``users`` users and ``orders`` orders over the existing catalog"""
+    rng = random.Random(seed)
+    password = make_password('benchmark')
+    for batch in _batched(lambda index: User(email=f'user{index}@example.com', password=password), users):
+        User.objects.bulk_create(batch)
+
+    user_ids = list(User.objects.values_list('id', flat=True))
+    products = list(Product.objects.values_list('id', 'price'))
+
+    for batch in _batched(lambda index: Order(
+        user_id=rng.choice(user_ids),
+        total_price=Decimal('0.00'),
+        shipping_address='1 Benchmark Street',
+        phone='555-0100',
+        status=rng.choice(['pending', 'shipped', 'delivered']),
+    ), orders):
+        # Order has no post_save side effects on create, so bulk_create is safe
+        created = Order.objects.bulk_create(batch)
+        items = []
+        for order in created:
+            for product_id, price in rng.sample(products, min(items_per_order, len(products))):
+                items.append(OrderItem(order=order, product_id=product_id, quantity=1, price=price))
+        OrderItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+
+
+@contextmanager
+def fast_writes():
+    """Trade durability for speed while seeding a throwaway SQLite database"""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = OFF')
+        cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous = FULL')
+            cursor.execute('PRAGMA journal_mode = DELETE')
+
+
+def seed(products=10000, users=1000, orders=10000, items_per_order=3, categories=20, seed=0):
+    """Seed a whole dataset and return its size and how long it took"""
+    start = time.perf_counter()
+    with fast_writes():
+        seed_catalog(categories=categories, products=products, seed=seed)
+        seed_orders(users=users, orders=orders, items_per_order=items_per_order, seed=seed)
+    return {
+        'categories': categories,
+        'products': products,
+        'users': users,
+        'orders': orders,
+        'order_items': OrderItem.objects.count(),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
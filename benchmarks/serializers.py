@@ -0,0 +1,83 @@
+"""Compare DRF ModelSerializer rendering with the values() fast path.
+
+Renders the same product and category listings both ways, checks the JSON
+is byte-identical and reports rows per second::
+
+    python -m benchmarks.serializers [--products 20000] [--page-size 1000] [--repeat 20]
+"""
+import argparse
+import json
+import time
+
+from benchmarks import setup
+
+
+def measure(render, repeat):
+    """Return the best wall time of ``repeat`` calls and the last output"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = render()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def compare(serializer_class, queryset, rows, repeat):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from ecommerce_project.values_serializers import ValuesSerializer
+
+    context = {'request': Request(APIRequestFactory().get('/'))}
+    renderer = JSONRenderer()
+
+    def drf():
+        return renderer.render(serializer_class(list(queryset[:rows]), many=True, context=context).data)
+
+    def fast():
+        serializer = ValuesSerializer.for_serializer(serializer_class(context=context))
+        return renderer.render(serializer.serialize(serializer.project(queryset)[:rows]))
+
+    drf_seconds, drf_output = measure(drf, repeat)
+    fast_seconds, fast_output = measure(fast, repeat)
+    count = len(json.loads(drf_output))
+    return {
+        'rows': count,
+        'identical': drf_output == fast_output,
+        'drf_rows_per_s': round(count / drf_seconds, 1),
+        'values_rows_per_s': round(count / fast_seconds, 1),
+        'speedup': round(drf_seconds / fast_seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from django.core.management import call_command
+    from benchmarks.seed import seed_catalog
+    from products.models import Category, Product
+    from products.serializers import CategorySerializer, ProductSerializer
+
+    call_command('migrate', verbosity=0)
+    if not Product.objects.exists():
+        seed_catalog(categories=200, products=args.products)
+
+    report = {
+        'product_list': compare(
+            ProductSerializer, Product.objects.select_related('category').order_by('name'),
+            args.page_size, args.repeat,
+        ),
+        'category_list': compare(CategorySerializer, Category.objects.order_by('name'), args.page_size, args.repeat),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
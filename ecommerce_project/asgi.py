@@ -11,15 +11,18 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
+
+# Set up Django before importing code that touches models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from channels.security.websocket import AllowedHostsOriginValidator
 from notifications.middleware import TokenAuthMiddlewareStack
 import notifications.routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
       "websocket": AllowedHostsOriginValidator(
         TokenAuthMiddlewareStack(
             URLRouter(
@@ -0,0 +1,262 @@
+"""Two-tier cache backend: a bounded in-process LRU in front of a shared cache.
+
+Configure the shared cache (Redis in production) under its own alias and
+point ``TwoTierCache`` at it::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'ecommerce_project.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'LOCAL_MAX_ENTRIES': 5000, 'LOCAL_TIMEOUT': 30},
+        },
+        'shared': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://...'},
+    }
+
+Reads are served from the local tier when possible and fall through to the
+shared cache otherwise. Every write goes to the shared cache and is recorded
+in an invalidation journal kept there: a sequence counter plus one entry per
+written key. Each worker replays the journal at most every ``SYNC_INTERVAL``
+seconds and evicts the keys other workers changed, so local copies lag the
+shared cache by at most that long. If the worker falls too far behind it
+drops its whole local tier.
+
+Options:
+
+* ``LOCAL_MAX_ENTRIES``: size bound of the local LRU (default 1000).
+* ``LOCAL_TIMEOUT``: longest a value is kept locally, in seconds (default 30).
+* ``LOCAL_KEY_PREFIXES``: only keys with these prefixes use the local tier
+  and the journal. Hot counters that change on every request, such as
+  statistics, should stay out (default: every key).
+* ``SYNC_INTERVAL``: seconds between journal checks (default 0.5).
+* ``JOURNAL_SIZE``: journal entries kept before a worker must resync (default 1000).
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+JOURNAL_KEY = 'two_tier_journal'
+
+_MISSING = object()
+
+# Local tiers are per process, shared by the per-thread backend instances
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """Thread-safe LRU of pickled values with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Journal position this tier is in sync with, and when to check again
+        self.position = None
+        self.next_sync = 0.0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, pickled)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def evict(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    """In-process LRU over a shared cache, kept coherent through a journal"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location or 'shared'
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 30)
+        self.sync_interval = options.get('SYNC_INTERVAL', 0.5)
+        self.journal_size = options.get('JOURNAL_SIZE', 1000)
+        prefixes = options.get('LOCAL_KEY_PREFIXES')
+        self.local_prefixes = tuple(prefixes) if prefixes is not None else None
+        with _tiers_lock:
+            if self.shared_alias not in _tiers:
+                _tiers[self.shared_alias] = LocalTier(options.get('LOCAL_MAX_ENTRIES', 1000))
+            self.local = _tiers[self.shared_alias]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def local_key(self, key, version):
+        """The local tier's key, or None when ``key`` bypasses the local tier"""
+        if self.local_prefixes is not None and not key.startswith(self.local_prefixes):
+            return None
+        return self.make_and_validate_key(key, version=version)
+
+    def local_timeout_for(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    # Invalidation journal
+
+    def publish(self, local_keys):
+        """Record ``local_keys`` as changed so other workers evict them"""
+        local_keys = [key for key in local_keys if key is not None]
+        if not local_keys:
+            return
+        self.local.evict(local_keys)
+        shared = self.shared
+        try:
+            position = shared.incr(JOURNAL_KEY, len(local_keys))
+        except ValueError:
+            if shared.add(JOURNAL_KEY, len(local_keys), None):
+                position = len(local_keys)
+            else:
+                position = shared.incr(JOURNAL_KEY, len(local_keys))
+        first = position - len(local_keys) + 1
+        shared.set_many(
+            {f'{JOURNAL_KEY}:{first + offset}': key for offset, key in enumerate(local_keys)},
+            self.journal_timeout(),
+        )
+
+    def journal_timeout(self):
+        # Long enough for every worker to have synced a few times
+        return max(60, int(self.sync_interval * 10))
+
+    def sync(self):
+        """Evict the local keys other workers changed since the last sync"""
+        now = time.monotonic()
+        if now < self.local.next_sync:
+            return
+        self.local.next_sync = now + self.sync_interval
+        position = self.shared.get(JOURNAL_KEY)
+        seen = self.local.position
+        self.local.position = position
+        if position == seen:
+            return
+        if position is None or seen is None or position < seen or position - seen > self.journal_size:
+            # First sync, shared cache flushed, or too far behind
+            self.local.clear()
+            return
+        names = [f'{JOURNAL_KEY}:{index}' for index in range(seen + 1, position + 1)]
+        changed = self.shared.get_many(names)
+        if len(changed) < len(names):
+            # Journal entries expired before we read them
+            self.local.clear()
+            return
+        self.local.evict(changed.values())
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            self.sync()
+            value = self.local.get(local_key)
+            if value is not _MISSING:
+                return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        if local_key is not None:
+            self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        found = {}
+        remote = []
+        for key in keys:
+            local_key = self.local_key(key, version)
+            value = self.local.get(local_key) if local_key is not None else _MISSING
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key, value in fetched.items():
+                local_key = self.local_key(key, version)
+                if local_key is not None:
+                    self.local.set(local_key, value, self.local_timeout)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self.local_key(key, version)
+        self.publish([local_key])
+        if local_key is not None and timeout != 0:
+            self.local.set(local_key, value, self.local_timeout_for(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.publish([self.local_key(key, version) for key in data])
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            # Other workers may still hold a copy that expired in the shared cache
+            self.publish([self.local_key(key, version)])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self.shared.touch(key, timeout, version=version)
+        if touched:
+            self.publish([self.local_key(key, version)])
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self.publish([self.local_key(key, version)])
+        return value
+
+    def has_key(self, key, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            self.sync()
+            if self.local.get(local_key) is not _MISSING:
+                return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        self.publish([self.local_key(key, version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self.publish([self.local_key(key, version) for key in keys])
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self.local.position = None
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,261 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+def _resolve_field(model, name):
+    """Return the model field a ``__`` ordering path ends at, or None for annotations"""
+    field = None
+    for part in name.split('__'):
+        try:
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation:
+            model = field.related_model
+    if field.is_relation:
+        field = field.target_field
+    return field
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks on the full ordering plus an ``id`` tie-breaker.
+
+    Unlike DRF's ``CursorPagination`` it follows whatever ordering the view
+    applied (including ``OrderingFilter``), and never issues ``OFFSET`` or
+    ``COUNT(*)`` unless the client asks for a count, so page N costs the same
+    as page 1.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+
+        self.count = None
+        if self.count_requested(request):
+            self.count = queryset.count()
+
+        if position is not None:
+            position = self.clean_position(queryset, position)
+            queryset = queryset.filter(self.seek_filter(position, reverse))
+        ordering = [_invert(field) for field in self.ordering] if reverse else self.ordering
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = rows
+        return rows
+
+    def get_ordering(self, queryset):
+        """Return the queryset ordering with the ``id`` tie-breaker appended"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        for field in ordering:
+            if not isinstance(field, str):
+                raise FieldError('KeysetPagination only supports ordering by field names.')
+
+        names = [field.lstrip('-') for field in ordering]
+        if self.tiebreaker not in names and 'pk' not in names:
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f'-{self.tiebreaker}' if descending else self.tiebreaker)
+        return ordering
+
+    def clean_position(self, queryset, position):
+        """Convert client-supplied cursor values with their ordering fields; 404 if invalid"""
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            model_field = _resolve_field(queryset.model, field.lstrip('-'))
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(value if model_field is None else model_field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def seek_filter(self, position, reverse):
+        """Build ``(a > x) OR (a = x AND b > y) OR ...`` for the cursor position"""
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        seek = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            seek |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return seek
+
+    def get_position(self, row):
+        """Return the JSON-safe ordering values of a row (model instance or dict)"""
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(row, dict):
+                value = row[name]
+            else:
+                value = row
+                for part in name.split('__'):
+                    value = getattr(value, part)
+                if hasattr(value, 'pk'):
+                    value = value.pk
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            position.append(value)
+        return position
+
+    def count_requested(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = data['p'], bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode())
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Nothing left on this side of the cursor: go back to the start
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CursorPaginationMixin:
+    """Let clients opt into keyset pagination with ``?pagination=cursor``.
+
+    Page-number pagination stays the default so existing ``?page=`` clients
+    keep working; any request carrying a cursor switches mode automatically.
+    """
+    cursor_pagination_class = KeysetPagination
+    pagination_mode_query_param = 'pagination'
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return (
+            params.get(self.pagination_mode_query_param) == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.use_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+
+def paging_params(paginator):
+    """The query parameters a paginator's links change"""
+    names = (getattr(paginator, 'page_query_param', None), getattr(paginator, 'cursor_query_param', None))
+    return [name for name in names if name]
+
+
+def detach_links(payload, params):
+    """Reduce the ``next``/``previous`` links of a paginated payload to their ``params``.
+
+    Links are absolute and carry the query string of the request that built
+    them; a payload shared between requests keeps only the paging values
+    (``None`` for a parameter the link removes) and ``attach_links`` rebuilds
+    the links for each request.
+    """
+    if not isinstance(payload, dict):
+        return payload
+    for name in ('next', 'previous'):
+        link = payload.get(name)
+        if link is not None:
+            query = parse_qs(urlsplit(link).query)
+            payload[name] = {param: query[param][0] if param in query else None for param in params}
+    return payload
+
+
+def attach_links(payload, request):
+    """Rebuild the links of a ``detach_links`` payload against ``request``'s URL"""
+    if not isinstance(payload, dict):
+        return payload
+    url = request.build_absolute_uri()
+    payload = dict(payload)
+    for name in ('next', 'previous'):
+        params = payload.get(name)
+        if params is not None:
+            link = url
+            for param, value in params.items():
+                link = remove_query_param(link, param) if value is None else replace_query_param(link, param, value)
+            payload[name] = link
+    return payload
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
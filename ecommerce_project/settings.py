@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -48,9 +49,12 @@ INSTALLED_APPS = [
     'products',
     'orders',
     'notifications',
+    'metrics',
+    'tasks',
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,6 +129,96 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Caches: a per-process LRU (ecommerce_project.cache.TwoTierCache) in front of
+# the shared cache. The shared tier is Redis when REDIS_URL is set, otherwise
+# a local-memory stand-in.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'ecommerce_project.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 5000,
+            'LOCAL_TIMEOUT': 30,
+            # Catalog generations and payloads; counters stay shared-only
+            'LOCAL_KEY_PREFIXES': [
+                'catalog_generation_', 'catalog_modified_', 'catalog_slug_', 'category:', 'product:',
+            ],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+        'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+
+# Channel layer for WebSocket notifications: Redis in production, sharded
+# across CHANNEL_REDIS_URLS (comma separated) when several are given, and
+# in-memory otherwise. capacity bounds the messages waiting per channel.
+CHANNEL_REDIS_URLS = [url for url in os.environ.get('CHANNEL_REDIS_URLS', REDIS_URL or '').split(',') if url]
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {'hosts': CHANNEL_REDIS_URLS, 'capacity': 100, 'expiry': 60, 'group_expiry': 86400},
+    } if CHANNEL_REDIS_URLS else {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'CONFIG': {'capacity': 100, 'expiry': 60, 'group_expiry': 86400},
+    },
+}
+
+# Per-connection send buffer (notifications.delivery): messages kept for a
+# slow client, and seconds a frame may take before the client is dropped.
+# Daphne does not block send() on a slow socket, so the bound that holds is
+# the unacknowledged window: clients ack with {"ack": <id>}, and a client that
+# leaves this many frames unacked for NOTIFICATION_SEND_TIMEOUT is dropped
+# (0 disables the window, leaving only servers with write backpressure bounded)
+NOTIFICATION_QUEUE_SIZE = 50
+NOTIFICATION_SEND_TIMEOUT = 10
+NOTIFICATION_UNACKED_LIMIT = 50
+
+# Days of order notifications kept for replay (manage.py prune_notification_outbox)
+NOTIFICATION_OUTBOX_RETENTION_DAYS = 30
+
+# Seconds before the client's last seen notification that a reconnect replays
+# again, covering ids that committed out of order; clients dedupe by id
+NOTIFICATION_REPLAY_OVERLAP = 10
+
+# RedisCartStorage talks to the shared tier directly
+CART_STORAGE_REDIS_ALIAS = 'shared'
+
+# Precompute the catalog cache in the background after a worker starts
+# (see products.warmup); same options as manage.py warm_catalog_cache.
+# 'host' is the Host header clients send (it is part of the cache keys); when
+# unset, the startup warm-up uses the first request's host and the post-checkout
+# refresh does not re-warm.
+CATALOG_WARM_ON_STARTUP = False
+CATALOG_WARM_OPTIONS = {'top_products': 100, 'pages': 1, 'workers': 4}
+
+# Checkouts reserve stock without invalidating the catalog cache; the task
+# worker publishes the new stock (and re-warms the catalog) at most once per
+# this many seconds
+CATALOG_STOCK_REFRESH_INTERVAL = 30
+
+# Cached (id, is_active, is_staff) principals for token auth (users.principal):
+# seconds kept in-process and in the shared cache
+USER_PRINCIPAL_LOCAL_TTL = 30
+USER_PRINCIPAL_CACHE_TTL = 300
+
+# Background tasks (tasks app, run by manage.py run_tasks): seconds a worker
+# holds a task before another worker may run it again
+TASKS_LEASE_SECONDS = 300
+# Days finished tasks (and their idempotency keys) are kept
+TASKS_RETENTION_DAYS = 7
+
+# Per-endpoint query/latency instrumentation (metrics app); off by default
+REQUEST_METRICS_ENABLED = False
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -139,6 +233,9 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Access tokens carry is_staff for users.authentication.StatelessJWTAuthentication
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.PrincipalTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.PrincipalTokenRefreshSerializer',
 }
 
 
@@ -0,0 +1,155 @@
+"""Sparse fieldsets: ``?fields=`` / ``?exclude=`` projection.
+
+``SparseFieldsetSerializerMixin`` drops the fields a client did not ask for
+from the top-level serializer of a read request, and
+``SparseFieldsetViewMixin`` narrows the queryset to the columns, joins and
+prefetches those fields read. ``GET /api/products/products/?fields=id,name,price``
+therefore neither selects nor serializes the product description.
+
+Unknown names are ignored, so ``?fields=`` values that select a preset
+(``OrderViewSet``'s ``summary``) pass through untouched. Nested serializers
+always render in full.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def _parse_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def select_field_names(names, params):
+    """Return the entries of ``names`` kept by ``?fields=``/``?exclude=``, in order"""
+    requested = {name for name in _parse_names(params.get(FIELDS_PARAM, '')) if name in names}
+    excluded = set(_parse_names(params.get(EXCLUDE_PARAM, '')))
+    return [name for name in names if (not requested or name in requested) and name not in excluded]
+
+
+class SparseFieldsetSerializerMixin:
+    """Serializer mixin keeping only the fields requested by the client.
+
+    ``Meta.projection_sources`` maps fields backed by a model property to the
+    columns the property reads, e.g. ``{'total_price': ['subtotal']}``, so the
+    view can still defer everything else.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self.is_projection_root():
+            return fields
+        return {name: fields[name] for name in select_field_names(list(fields), request.query_params)}
+
+    def is_projection_root(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class SparseFieldsetViewMixin:
+    """ViewSet mixin narrowing the queryset to what the sparse fieldset reads"""
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        """Names of the serializer fields kept for this request, or None when not narrowed"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            params = self.request.query_params
+            if self.action in self.sparse_fieldset_actions and (
+                params.get(FIELDS_PARAM) or params.get(EXCLUDE_PARAM)
+            ):
+                names = list(self.get_serializer_class()().fields)
+                kept = select_field_names(names, params)
+                if kept != names:
+                    self._sparse_fields = kept
+        return self._sparse_fields
+
+    def get_sparse_fields_signature(self):
+        """Cache key fragment identifying the sparse fieldset ('' for every field)"""
+        kept = self.get_sparse_fields()
+        return '' if kept is None else 'fields=' + ','.join(kept)
+
+    def filter_queryset(self, queryset):
+        # Project after filtering so the ordering columns are known
+        queryset = super().filter_queryset(queryset)
+        kept = self.get_sparse_fields()
+        if kept is None:
+            return queryset
+        return self.project_queryset(queryset, kept)
+
+    def project_queryset(self, queryset, kept):
+        """Drop the columns, joins and prefetches none of the ``kept`` fields read"""
+        serializer_class = self.get_serializer_class()
+        fields = serializer_class().fields
+        sources = getattr(getattr(serializer_class, 'Meta', None), 'projection_sources', {})
+        opts = queryset.model._meta
+        columns, relations = set(), set()
+        narrow_columns = True
+
+        for name in kept:
+            field = fields[name]
+            if name in sources:
+                columns.update(sources[name])
+                continue
+            path = field.source_attrs
+            if not path:
+                # source='*' hands the whole instance to the field
+                narrow_columns = False
+                continue
+            try:
+                model_field = opts.get_field(path[0])
+            except FieldDoesNotExist:
+                if path[0] not in queryset.query.annotations:
+                    # A property or method we cannot see into
+                    narrow_columns = False
+                continue
+            if not model_field.concrete:
+                # Reverse relation, loaded by a prefetch
+                relations.add(path[0])
+            elif model_field.is_relation and len(path) > 1:
+                relations.add(path[0])
+                columns.update({path[0], '__'.join(path)})
+            else:
+                columns.add(path[0])
+                if isinstance(field, BaseSerializer):
+                    # Nested serializers render the whole related row
+                    relations.add(path[0])
+
+        for ordering in queryset.query.order_by or opts.ordering:
+            if isinstance(ordering, str):
+                name = ordering.lstrip('-').split('__')[0]
+                if name not in queryset.query.annotations:
+                    columns.add(name)
+
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            kept_joins = [path for path in _join_paths(select_related) if path.split('__')[0] in relations]
+            queryset = queryset.select_related(None)
+            if kept_joins:
+                queryset = queryset.select_related(*kept_joins)
+        lookups = queryset._prefetch_related_lookups
+        if lookups:
+            kept_lookups = [
+                lookup for lookup in lookups
+                if getattr(lookup, 'prefetch_to', lookup).split('__')[0] in relations
+            ]
+            queryset = queryset.prefetch_related(None).prefetch_related(*kept_lookups)
+
+        if narrow_columns:
+            columns.add(opts.pk.name)
+            queryset = queryset.only(*sorted(columns))
+        return queryset
+
+
+def _join_paths(select_related, prefix=''):
+    paths = []
+    for name, nested in select_related.items():
+        path = prefix + name
+        paths.append(path)
+        paths.extend(_join_paths(nested, path + '__'))
+    return paths
@@ -0,0 +1,173 @@
+"""Read-only fast path for hot list endpoints.
+
+``ValuesSerializer`` renders ``QuerySet.values()`` rows using the field
+layout of an existing ``ModelSerializer``. The per-field encoders are
+resolved once per listing rather than looked up per row, and no model
+instances are built, so the output is the same data DRF would produce at a
+fraction of the cost::
+
+    fast = ValuesSerializer.for_serializer(self.get_serializer())
+    if fast is not None:
+        data = fast.serialize(fast.project(queryset))
+
+``for_serializer`` returns None for serializers it cannot reproduce exactly
+(nested serializers, method fields, a custom ``to_representation``...), and
+callers fall back to the regular serializer.
+"""
+import decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField as ModelFileField
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.settings import ISO_8601, api_settings
+
+# Fields whose to_representation() returns a database value unchanged
+PASSTHROUGH_FIELDS = (
+    drf_fields.BooleanField,
+    drf_fields.CharField,
+    drf_fields.IntegerField,
+    drf_fields.ReadOnlyField,
+)
+
+
+class ValuesSerializer:
+    """Serialize ``values()`` rows laid out like ``serializer``'s fields"""
+
+    def __init__(self, serializer, columns):
+        self.serializer = serializer
+        # [(field name, values() column, DRF field)]
+        self.columns = columns
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """Return a ValuesSerializer for ``serializer``, or None if unsupported"""
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            return None
+        model = serializer.Meta.model
+        columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            column = cls.get_column(model, field)
+            if column is None:
+                return None
+            columns.append((name, column, field))
+        return cls(serializer, columns)
+
+    @staticmethod
+    def get_column(model, field):
+        """Return the ``values()`` lookup that feeds ``field``, or None"""
+        path = field.source_attrs
+        if not path or isinstance(field, (serializers.BaseSerializer, drf_fields.SerializerMethodField)):
+            return None
+        if isinstance(field, relations.PrimaryKeyRelatedField):
+            if len(path) != 1 or field.pk_field is not None:
+                return None
+        elif isinstance(field, relations.RelatedField):
+            return None
+        opts = model._meta
+        for index, part in enumerate(path):
+            try:
+                model_field = opts.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            if index < len(path) - 1:
+                if not model_field.is_relation:
+                    return None
+                opts = model_field.related_model._meta
+            elif model_field.is_relation and not isinstance(field, relations.PrimaryKeyRelatedField):
+                return None
+        if isinstance(field, drf_fields.FileField) and (len(path) != 1 or not isinstance(model_field, ModelFileField)):
+            return None
+        return '__'.join(path)
+
+    def project(self, queryset):
+        """Turn ``queryset`` into ``values()`` rows carrying every column needed.
+
+        The ordering columns are included too so keyset pagination can read
+        its cursor position from the rows.
+        """
+        lookups = [column for name, column, field in self.columns]
+        for ordering in queryset.query.order_by or queryset.model._meta.ordering:
+            if isinstance(ordering, str):
+                lookups.append(ordering.lstrip('-'))
+        lookups.append(queryset.model._meta.pk.name)
+        return queryset.values(*dict.fromkeys(lookups))
+
+    def serialize(self, rows):
+        """Return the list of representations of ``rows``"""
+        encoders = [(name, column, self.get_encoder(field)) for name, column, field in self.columns]
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, encode in encoders:
+                value = row[column]
+                if value is None:
+                    item[name] = None
+                elif encode is None:
+                    item[name] = value
+                else:
+                    item[name] = encode(value)
+            data.append(item)
+        return data
+
+    def get_encoder(self, field):
+        """Return a function encoding one raw column value (None: unchanged)"""
+        if isinstance(field, drf_fields.DecimalField):
+            return self.decimal_encoder(field)
+        if isinstance(field, drf_fields.DateTimeField):
+            return self.datetime_encoder(field)
+        if isinstance(field, drf_fields.FileField):
+            return self.file_encoder(field)
+        if isinstance(field, (relations.PrimaryKeyRelatedField,) + PASSTHROUGH_FIELDS):
+            return None
+        return field.to_representation
+
+    def decimal_encoder(self, field):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+            return field.to_representation
+
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+
+        def encode(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+        return encode
+
+    def datetime_encoder(self, field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def encode(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return encode
+
+    def file_encoder(self, field):
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return lambda name: name or None
+
+        storage = self.serializer.Meta.model._meta.get_field(field.source_attrs[0]).storage
+        request = self.serializer.context.get('request')
+
+        def encode(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return encode
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class MetricsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'metrics'
+
+    def ready(self):
+        if getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            from .instrumentation import instrument_serializers
+            instrument_serializers()
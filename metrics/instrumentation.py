@@ -0,0 +1,65 @@
+"""Per-request measurements: SQL queries, DB time and serializer time."""
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from rest_framework import serializers
+
+# Collector of the request being processed by RequestMetricsMiddleware
+current_request = ContextVar('current_request_metrics', default=None)
+
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class RequestCollector:
+    """Accumulates what one request spends on SQL and serialization"""
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self._serializer_depth = 0
+        self._statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            # Literals inlined by the ORM (e.g. IN lists) would hide repeats
+            self._statements[NUMBER_RE.sub('?', sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Statements executed more than once in this request (N+1 suspects)"""
+        return {sql: count for sql, count in self._statements.items() if count > 1}
+
+
+def instrument_serializers():
+    """Time ``BaseSerializer.data`` for the request being measured"""
+    base = serializers.BaseSerializer
+    if getattr(base.data, 'fget', None) is not None and getattr(base.data.fget, 'instrumented', False):
+        return
+    original = base.data.fget
+
+    def data(self):
+        collector = current_request.get()
+        if collector is None:
+            return original(self)
+        collector._serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            collector._serializer_depth -= 1
+            # Only the outermost serializer counts, nested ones are inside it
+            if not collector._serializer_depth:
+                collector.serializer_time += time.perf_counter() - start
+
+    data.instrumented = True
+    base.data = property(data)
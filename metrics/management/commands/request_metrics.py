@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from metrics.recorder import recorder
+
+
+class Command(BaseCommand):
+    help = 'Report per-endpoint latency and query percentiles recorded by RequestMetricsMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+        parser.add_argument('--reset', action='store_true', help='Clear the recorded samples afterwards')
+
+    def handle(self, *args, **options):
+        report = recorder.report()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif not report:
+            self.stdout.write('No samples recorded. Is REQUEST_METRICS_ENABLED set?')
+        else:
+            header = f"{'endpoint':<40} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'db p95':>9} {'ser p95':>9} {'q p95':>6} {'dups':>5}"
+            self.stdout.write(header)
+            for endpoint, stats in report.items():
+                self.stdout.write(
+                    f"{endpoint:<40} {stats['requests']:>6} "
+                    f"{stats['total_ms']['p50']:>9.2f} {stats['total_ms']['p95']:>9.2f} {stats['total_ms']['p99']:>9.2f} "
+                    f"{stats['db_ms']['p95']:>9.2f} {stats['serializer_ms']['p95']:>9.2f} "
+                    f"{stats['queries']['p95']:>6} {stats['requests_with_duplicate_queries']:>5}"
+                )
+        if options['reset']:
+            recorder.reset()
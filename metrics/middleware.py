@@ -0,0 +1,65 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .instrumentation import RequestCollector, current_request
+from .recorder import recorder
+
+
+class RequestMetricsMiddleware:
+    """Record query count, duplicate queries, DB, serializer and total time per view.
+
+    Opt in with ``REQUEST_METRICS_ENABLED = True``. Samples are aggregated per
+    DRF action (``ProductViewSet.list``) and every response carries a
+    ``Server-Timing`` header with the measurements of that request.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = RequestCollector()
+        token = current_request.set(collector)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        total = time.perf_counter() - start
+
+        duplicates = collector.duplicates
+        if collector.endpoint is not None:
+            recorder.record(collector.endpoint, {
+                'total_ms': round(total * 1000, 3),
+                'db_ms': round(collector.db_time * 1000, 3),
+                'serializer_ms': round(collector.serializer_time * 1000, 3),
+                'queries': collector.queries,
+                'duplicate_queries': sum(count - 1 for count in duplicates.values()),
+            }, duplicates)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={collector.db_time * 1000:.2f};desc="{collector.queries} queries"',
+            f'serialize;dur={collector.serializer_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        collector = current_request.get()
+        if collector is None:
+            return None
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        name = view_class.__name__ if view_class else view_func.__name__
+        # ViewSets map HTTP methods to actions (get -> list/retrieve)
+        actions = getattr(view_func, 'actions', None) or {}
+        method = request.method.lower()
+        collector.endpoint = f'{name}.{actions.get(method, method)}'
+        return None
@@ -0,0 +1,104 @@
+"""Aggregation of request samples into per-endpoint percentiles.
+
+Every worker keeps recent samples in memory and periodically publishes them
+to the default cache, so the staff endpoint and the ``request_metrics``
+command can report across processes.
+"""
+import math
+import os
+import socket
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+WORKERS_KEY = 'request_metrics_workers'
+SAMPLE_FIELDS = ('total_ms', 'db_ms', 'serializer_ms', 'queries', 'duplicate_queries')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class MetricsRecorder:
+    """Bounded per-endpoint sample store for one worker process"""
+
+    def __init__(self, max_samples=None, publish_interval=None):
+        self.max_samples = max_samples or getattr(settings, 'REQUEST_METRICS_MAX_SAMPLES', 1000)
+        self.publish_interval = publish_interval or getattr(settings, 'REQUEST_METRICS_PUBLISH_INTERVAL', 10)
+        self.worker_key = f'request_metrics_{socket.gethostname()}_{os.getpid()}'
+        self._lock = threading.Lock()
+        self._last_published = 0.0
+        self.reset_local()
+
+    def reset_local(self):
+        with self._lock:
+            self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+            self._duplicates = defaultdict(Counter)
+
+    def record(self, endpoint, sample, duplicates=None):
+        with self._lock:
+            self._samples[endpoint].append(tuple(sample[field] for field in SAMPLE_FIELDS))
+            if duplicates:
+                self._duplicates[endpoint].update(duplicates)
+        if time.monotonic() - self._last_published >= self.publish_interval:
+            self.publish()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'samples': {endpoint: list(samples) for endpoint, samples in self._samples.items()},
+                'duplicates': {endpoint: dict(counter.most_common(5)) for endpoint, counter in self._duplicates.items()},
+            }
+
+    def publish(self):
+        """Share this worker's samples through the cache"""
+        self._last_published = time.monotonic()
+        cache.set(self.worker_key, self.snapshot(), None)
+        workers = set(cache.get(WORKERS_KEY, ()))
+        if self.worker_key not in workers:
+            cache.set(WORKERS_KEY, workers | {self.worker_key}, None)
+
+    def reset(self):
+        """Drop samples of every worker"""
+        self.reset_local()
+        workers = cache.get(WORKERS_KEY, ())
+        cache.delete_many(list(workers) + [WORKERS_KEY])
+
+    def report(self):
+        """Percentiles per endpoint across all workers that published samples"""
+        self.publish()
+        samples = defaultdict(list)
+        duplicates = defaultdict(Counter)
+        for snapshot in cache.get_many(list(cache.get(WORKERS_KEY, ()))).values():
+            for endpoint, rows in snapshot['samples'].items():
+                samples[endpoint].extend(rows)
+            for endpoint, counter in snapshot['duplicates'].items():
+                duplicates[endpoint].update(counter)
+
+        report = {}
+        for endpoint, rows in sorted(samples.items()):
+            columns = dict(zip(SAMPLE_FIELDS, zip(*rows)))
+            report[endpoint] = {
+                'requests': len(rows),
+                **{
+                    field: {
+                        'p50': percentile(columns[field], 0.50),
+                        'p95': percentile(columns[field], 0.95),
+                        'p99': percentile(columns[field], 0.99),
+                        'max': max(columns[field]),
+                    }
+                    for field in ('total_ms', 'db_ms', 'serializer_ms', 'queries')
+                },
+                'requests_with_duplicate_queries': sum(1 for count in columns['duplicate_queries'] if count),
+                'top_duplicate_queries': dict(duplicates[endpoint].most_common(5)),
+            }
+        return report
+
+
+recorder = MetricsRecorder()
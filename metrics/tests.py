@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .instrumentation import instrument_serializers
+from .recorder import recorder
+
+
+@override_settings(
+    REQUEST_METRICS_ENABLED=True,
+    MIDDLEWARE=['metrics.middleware.RequestMetricsMiddleware'],
+)
+class RequestMetricsMiddlewareTests(TestCase):
+    """Requests are measured and aggregated per DRF action"""
+
+    def setUp(self):
+        cache.clear()
+        recorder.reset()
+        instrument_serializers()
+
+    def test_samples_are_grouped_by_action(self):
+        response = self.client.get('/api/products/categories/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.client.get('/api/products/categories/')
+
+        report = recorder.report()
+        self.assertEqual(report['CategoryViewSet.list']['requests'], 2)
+        # The second request is served from the cache
+        self.assertEqual(report['CategoryViewSet.list']['queries']['max'], 1)
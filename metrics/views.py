@@ -0,0 +1,18 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .recorder import recorder
+
+
+class RequestMetricsView(APIView):
+    """Per-endpoint latency and query percentiles (staff only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(recorder.report())
+
+    def delete(self, request):
+        """Reset the collected samples"""
+        recorder.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,3 +1,10 @@
 from django.contrib import admin
-
+from .models import NotificationOutbox
 # Register your models here.
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'order_id', 'created_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user', 'order']
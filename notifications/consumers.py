@@ -1,9 +1,35 @@
+import asyncio
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from datetime import timedelta
+from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.db.models import Q
+from .delivery import QUEUE_SIZE, REPLAY_OVERLAP, SEND_TIMEOUT, UNACKED_LIMIT, AckWindow, SendBuffer, delivery_stats
+from .dispatch import user_group
+from .models import NotificationOutbox
+
+RESYNC_MESSAGE = {'type': 'resync'}
 
-User = get_user_model()
+@database_sync_to_async
+def missed_notifications(user_id, last_seen, limit):
+    """Outbox entries of a user the client may have missed since ``last_seen``, oldest first.
+
+    Ids are allocated on insert but become visible on commit, so an entry
+    with a lower id can commit after ``last_seen`` was delivered. Entries
+    created up to ``REPLAY_OVERLAP`` seconds before ``last_seen`` are sent
+    again; clients drop ids they already have. When there are more than
+    ``limit``, the newest ``limit - 1`` follow a ``resync`` frame.
+    """
+    entries = NotificationOutbox.objects.filter(user_id=user_id)
+    missed = Q(id__gt=last_seen)
+    seen_at = entries.filter(id=last_seen).values_list('created_at', flat=True).first()
+    if seen_at is not None:
+        missed |= Q(created_at__gte=seen_at - timedelta(seconds=REPLAY_OVERLAP))
+    newest = list(entries.filter(missed).exclude(id=last_seen).order_by('-id')[:limit + 1])
+    if len(newest) <= limit:
+        return [entry.as_message() for entry in reversed(newest)]
+    return [RESYNC_MESSAGE, *(entry.as_message() for entry in reversed(newest[:limit - 1]))]
 
 class OrderNotificationConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for order notifications"""
@@ -19,7 +45,7 @@ class OrderNotificationConsumer(AsyncWebsocketConsumer):
             return
         
         # Create a user-specific group
-        self.group_name = f"user_{self.user.id}"
+        self.group_name = user_group(self.user.id)
         
         # Join the group
         await self.channel_layer.group_add(
@@ -28,6 +54,34 @@ class OrderNotificationConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        # Messages are written by a separate task from a bounded buffer
+        self.buffer = SendBuffer(QUEUE_SIZE, stats=delivery_stats)
+        self.unacked = AckWindow(UNACKED_LIMIT)
+        self.writer = asyncio.ensure_future(self.write_messages())
+        delivery_stats.connected(self.user.id, self.buffer)
+        delivery_stats.start_publishing()
+        await self.replay()
+        await delivery_stats.maybe_publish()
+    
+    async def replay(self):
+        """Queue what the client missed since the ?last_seen= notification id"""
+        self.replayed_ids = set()
+        query_string = parse_qs(self.scope['query_string'].decode())
+        try:
+            last_seen = int(query_string.get('last_seen', [''])[0])
+        except ValueError:
+            return
+        # Joined the group first, so nothing falls between replay and live messages
+        for message in await missed_notifications(self.user.id, last_seen, self.buffer.maxsize):
+            self.buffer.put(message)
+            if 'id' in message:
+                self.replayed_ids.add(message['id'])
+    
+    def queue_message(self, message):
+        """Buffer a live message unless the replay already covered it"""
+        if message.get('id') not in self.replayed_ids:
+            self.buffer.put(message)
     
     async def disconnect(self, close_code):
         """Disconnect from WebSocket"""
@@ -37,13 +91,44 @@ class OrderNotificationConsumer(AsyncWebsocketConsumer):
                 self.group_name,
                 self.channel_name
             )
+        if hasattr(self, 'writer'):
+            self.writer.cancel()
+            delivery_stats.disconnected(self.user.id, self.buffer)
+            await delivery_stats.maybe_publish()
     
     async def receive(self, text_data):
         """Receive message from WebSocket"""
-        # We don't expect to receive messages, but handle it anyway
-        pass
+        # Clients only send acknowledgements: {"ack": <notification id>}
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            return
+        if isinstance(data, dict) and hasattr(self, 'unacked'):
+            self.unacked.ack(data.get('ack'))
+    
+    async def write_messages(self):
+        """Send buffered messages, disconnecting clients that stop reading or acking"""
+        while True:
+            # Wait before taking a message, so the buffer keeps coalescing
+            if not await self.unacked.wait_for_room(SEND_TIMEOUT):
+                delivery_stats.count('slow_disconnects')
+                await self.close()
+                return
+            message = await self.buffer.get()
+            try:
+                await asyncio.wait_for(self.send(text_data=json.dumps(message)), SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                delivery_stats.count('slow_disconnects')
+                await self.close()
+                return
+            self.unacked.sent(message)
+            delivery_stats.count('sent')
     
     async def order_notification(self, event):
-        """Send order notification to WebSocket"""
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps(event['message']))
\ No newline at end of file
+        """Queue an order notification for the WebSocket"""
+        self.queue_message(event['message'])
+    
+    async def order_notifications(self, event):
+        """Queue a batch of order notifications, one frame per message"""
+        for message in event['messages']:
+            self.queue_message(message)
@@ -0,0 +1,233 @@
+"""Bounded per-connection delivery of notifications to WebSocket clients.
+
+Messages from the channel layer are not written to the socket by the
+handler that receives them. They go into the connection's ``SendBuffer``,
+and a writer task drains it, so a slow client never holds up the channel
+layer receive loop:
+
+* the buffer holds at most ``NOTIFICATION_QUEUE_SIZE`` messages;
+* a newer message for an order that is still queued replaces the queued one
+  (only the latest status matters);
+* when the buffer is full the oldest message is dropped;
+* a client that does not take a frame within ``NOTIFICATION_SEND_TIMEOUT``
+  seconds is disconnected (it can reconnect and catch up).
+
+Daphne does not apply write backpressure: ``send()`` returns as soon as the
+frame is handed to Twisted, so a stalled client would only grow the
+transport's buffer. Clients therefore acknowledge frames by sending
+``{"ack": <id>}`` (which covers every frame up to that one), and at most
+``NOTIFICATION_UNACKED_LIMIT`` frames are in flight per connection; a client
+that leaves the window full for ``NOTIFICATION_SEND_TIMEOUT`` seconds is
+disconnected like a slow reader.
+
+``delivery_stats`` counts connections and queued messages per worker and
+shares them through the cache, like the request metrics recorder: on
+connect and disconnect, and every ``NOTIFICATION_STATS_PUBLISH_INTERVAL``
+seconds while the worker has connections.
+"""
+import asyncio
+import itertools
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+QUEUE_SIZE = getattr(settings, 'NOTIFICATION_QUEUE_SIZE', 50)
+SEND_TIMEOUT = getattr(settings, 'NOTIFICATION_SEND_TIMEOUT', 10)
+PUBLISH_INTERVAL = getattr(settings, 'NOTIFICATION_STATS_PUBLISH_INTERVAL', 10)
+REPLAY_OVERLAP = getattr(settings, 'NOTIFICATION_REPLAY_OVERLAP', 10)
+UNACKED_LIMIT = getattr(settings, 'NOTIFICATION_UNACKED_LIMIT', 50)
+
+WORKERS_KEY = 'notification_delivery_workers'
+COUNTERS = ('sent', 'coalesced', 'dropped', 'slow_disconnects')
+
+# Keys for messages that never coalesce
+_unique = itertools.count()
+
+
+class SendBuffer:
+    """Bounded queue of outgoing messages that coalesces updates per order"""
+
+    def __init__(self, maxsize=QUEUE_SIZE, stats=None):
+        self.maxsize = maxsize
+        self.stats = stats
+        self._messages = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def put(self, message):
+        """Queue ``message``; return 'queued', 'coalesced' or 'dropped'"""
+        order_id = message.get('order_id') if isinstance(message, dict) else None
+        key = ('order', order_id) if order_id is not None else ('message', next(_unique))
+        if key in self._messages:
+            del self._messages[key]
+            outcome = 'coalesced'
+        elif len(self._messages) >= self.maxsize:
+            self._messages.popitem(last=False)
+            outcome = 'dropped'
+        else:
+            outcome = 'queued'
+        self._messages[key] = message
+        self._ready.set()
+        if self.stats is not None and outcome != 'queued':
+            self.stats.count(outcome)
+        return outcome
+
+    async def get(self):
+        """Wait for and return the oldest queued message"""
+        while not self._messages:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._messages.popitem(last=False)[1]
+
+
+class AckWindow:
+    """Frames sent to a client and not yet acknowledged, bounded by ``limit``"""
+
+    def __init__(self, limit=UNACKED_LIMIT):
+        self.limit = limit
+        self._ids = deque()
+        self._acked = asyncio.Event()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def sent(self, message):
+        self._ids.append(message.get('id') if isinstance(message, dict) else None)
+
+    def ack(self, message_id):
+        """Acknowledge the frame with ``message_id`` and every frame sent before it"""
+        if message_id is None or message_id not in self._ids:
+            return
+        while self._ids.popleft() != message_id:
+            pass
+        self._acked.set()
+
+    async def wait_for_room(self, timeout):
+        """Wait until another frame may be sent; False if the client stays behind"""
+        if not self.limit:
+            return True
+        deadline = time.monotonic() + timeout
+        while len(self._ids) >= self.limit:
+            self._acked.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._acked.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+class DeliveryStats:
+    """Connection and queue counters for one worker process"""
+
+    def __init__(self, publish_interval=PUBLISH_INTERVAL):
+        self.publish_interval = publish_interval
+        self.worker_key = f'notification_delivery_{socket.gethostname()}_{os.getpid()}'
+        self._lock = threading.Lock()
+        self._last_published = 0.0
+        self._publisher = None
+        self.reset_local()
+
+    def reset_local(self):
+        with self._lock:
+            self._connections = {}
+            self._buffers = set()
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def connected(self, user_id, buffer):
+        with self._lock:
+            self._connections[user_id] = self._connections.get(user_id, 0) + 1
+            self._buffers.add(buffer)
+
+    def disconnected(self, user_id, buffer):
+        with self._lock:
+            remaining = self._connections.get(user_id, 0) - 1
+            if remaining > 0:
+                self._connections[user_id] = remaining
+            else:
+                self._connections.pop(user_id, None)
+            self._buffers.discard(buffer)
+            idle = not self._connections
+        if idle:
+            self.stop_publishing()
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def snapshot(self):
+        with self._lock:
+            depths = [len(buffer) for buffer in self._buffers]
+            return {
+                'connections': sum(self._connections.values()),
+                'users': len(self._connections),
+                'largest_group': max(self._connections.values(), default=0),
+                'queued_messages': sum(depths),
+                'max_queue_depth': max(depths, default=0),
+                **self._counters,
+            }
+
+    async def maybe_publish(self):
+        """Share this worker's snapshot at most every ``publish_interval`` seconds"""
+        if time.monotonic() - self._last_published >= self.publish_interval:
+            await self.publish()
+
+    async def publish(self):
+        """Share this worker's snapshot through the cache"""
+        self._last_published = time.monotonic()
+        await cache.aset(self.worker_key, self.snapshot(), self.publish_interval * 6)
+        workers = set(await cache.aget(WORKERS_KEY, ()))
+        if self.worker_key not in workers:
+            await cache.aset(WORKERS_KEY, workers | {self.worker_key}, None)
+
+    def start_publishing(self):
+        """Publish on a timer from the running event loop until the last disconnect"""
+        loop = asyncio.get_running_loop()
+        publisher = self._publisher
+        if publisher is None or publisher.done() or publisher.get_loop() is not loop:
+            self._publisher = loop.create_task(self._publish_periodically())
+
+    def stop_publishing(self):
+        publisher = self._publisher
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if publisher is not None and publisher.get_loop() is running:
+            publisher.cancel()
+            self._publisher = None
+
+    async def _publish_periodically(self):
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            await self.publish()
+
+    def report(self):
+        """Totals across the workers that published recently, plus each worker"""
+        workers = set(cache.get(WORKERS_KEY, ()))
+        snapshots = cache.get_many(list(workers))
+        if len(snapshots) < len(workers):
+            # Forget workers whose snapshot expired; live ones add themselves back
+            cache.set(WORKERS_KEY, set(snapshots), None)
+        # This worker's numbers are always current
+        snapshots[self.worker_key] = self.snapshot()
+        totals = {}
+        for snapshot in snapshots.values():
+            for name, value in snapshot.items():
+                if name in ('largest_group', 'max_queue_depth'):
+                    totals[name] = max(totals.get(name, 0), value)
+                else:
+                    totals[name] = totals.get(name, 0) + value
+        return {'totals': totals, 'workers': dict(sorted(snapshots.items()))}
+
+
+delivery_stats = DeliveryStats()
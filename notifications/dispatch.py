@@ -0,0 +1,124 @@
+"""Order notification dispatch.
+
+Every status change is first appended to ``NotificationOutbox`` inside the
+transaction that saves the order, so clients that were offline can replay
+it on reconnect. It is then queued when their transaction commits and sent from a
+background thread, so saving an order never waits on the channel layer:
+
+* updates are coalesced per order (only the latest status is sent);
+* everything queued for a user within ``ORDER_NOTIFICATION_FLUSH_INTERVAL``
+  goes out as one ``group_send`` (an ``order_notifications`` batch event when
+  there is more than one message);
+* the sends of a batch run concurrently on one event loop.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'ORDER_NOTIFICATION_FLUSH_INTERVAL', 0.05)
+
+
+def user_group(user_id):
+    """Channel layer group of a user's notification sockets"""
+    return f'user_{user_id}'
+
+
+class NotificationDispatcher:
+    """Coalescing queue of order notifications drained by a daemon thread"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        # (user id, order id) -> message, oldest first
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def notify(self, user_id, order_id, message):
+        """Queue ``message`` for the user once the current transaction commits"""
+        transaction.on_commit(lambda: self.enqueue(user_id, order_id, message))
+
+    def enqueue(self, user_id, order_id, message):
+        key = (user_id, order_id)
+        with self._lock:
+            # A newer status for the same order replaces the queued one
+            self._pending.pop(key, None)
+            self._pending[key] = message
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != pid:
+                self._pid = pid
+                self._thread = threading.Thread(target=self._run, name='order-notifications', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Give updates made in the same burst a chance to share the batch
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception('Failed to send order notifications')
+
+    def drain(self):
+        """Send everything queued so far; return the number of messages sent"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            logger.warning('No channel layer configured; dropped %d order notifications', len(pending))
+            return 0
+
+        by_user = defaultdict(list)
+        for (user_id, order_id), message in pending.items():
+            by_user[user_id].append(message)
+        async_to_sync(self._send)(channel_layer, by_user)
+        return len(pending)
+
+    async def _send(self, channel_layer, by_user):
+        await asyncio.gather(*(
+            channel_layer.group_send(user_group(user_id), self.event(messages))
+            for user_id, messages in by_user.items()
+        ))
+
+    @staticmethod
+    def event(messages):
+        if len(messages) == 1:
+            return {'type': 'order_notification', 'message': messages[0]}
+        return {'type': 'order_notifications', 'messages': messages}
+
+
+dispatcher = NotificationDispatcher()
+
+
+def notify_order_status(order):
+    """Record a status update for ``order``'s owner and queue it for delivery"""
+    entry = NotificationOutbox.objects.create(user_id=order.user_id, order_id=order.id, message={
+        'order_id': order.id,
+        'status': order.status,
+        'message': f"Your order #{order.id} status has been updated to {order.get_status_display()}.",
+    })
+    dispatcher.notify(order.user_id, order.id, entry.as_message())
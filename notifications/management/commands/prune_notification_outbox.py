@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from notifications.models import NotificationOutbox
+
+
+class Command(BaseCommand):
+    help = 'Compact superseded order notifications and delete those past retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATION_OUTBOX_RETENTION_DAYS', 30),
+            help='Delete notifications older than this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # A newer status for the same order supersedes the older entries; clients
+        # replaying past them still receive the newer one
+        superseded = NotificationOutbox.objects.filter(
+            Exists(NotificationOutbox.objects.filter(order_id=OuterRef('order_id'), id__gt=OuterRef('id')))
+        )
+        compacted = self.delete_in_batches(superseded, options['batch_size'])
+
+        # Ids grow with time, so everything before the first recent entry is expired
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        first_recent = NotificationOutbox.objects.filter(created_at__gte=cutoff).order_by('id').values('id')[:1]
+        expired = NotificationOutbox.objects.all()
+        if first_recent.exists():
+            expired = expired.filter(id__lt=first_recent)
+        expired = self.delete_in_batches(expired, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {compacted} superseded and deleted {expired} expired notification(s).'
+        ))
+
+    def delete_in_batches(self, queryset, batch_size):
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += NotificationOutbox.objects.filter(id__in=ids).delete()[0]
@@ -1,33 +1,30 @@
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from django.db import close_old_connections
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
-from django.contrib.auth import get_user_model
+from users.principal import aget_principal
 
-User = get_user_model()
-
-@database_sync_to_async
-def get_user_from_token(token_key):
+async def get_user_from_token(token_key):
     """Get user from JWT token"""
     try:
-        # Verify token
+        # Verify token (signature and expiry are checked in-process)
         token = AccessToken(token_key)
-        user_id = token.payload.get('user_id')
-        
-        # Get user
-        return User.objects.get(id=user_id)
-    except (InvalidToken, TokenError, User.DoesNotExist):
+        user_id = token.payload.get(api_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
         return AnonymousUser()
+    
+    # Minimal cached principal; the database is only hit on a cache miss
+    user = await aget_principal(user_id) if user_id is not None else None
+    return user or AnonymousUser()
 
 class TokenAuthMiddleware(BaseMiddleware):
     """Custom middleware for token-based WebSocket authentication"""
     
     async def __call__(self, scope, receive, send):
-        # Close database connections to prevent them being reused across threads
-        close_old_connections()
+        # Database work happens in worker threads that clean up their own
+        # connections, so nothing blocking runs on the event loop here
         
         # Get token from query string
         query_string = parse_qs(scope['query_string'].decode())
@@ -1,3 +1,25 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class NotificationOutbox(models.Model):
+    """Append-only log of notifications, replayed to clients that reconnect"""
+    # Covered by the (user, id) index
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications', db_index=False)
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='notifications')
+    message = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Replay: a user's entries after a cursor, in sequence order
+            models.Index(fields=['user', 'id'], name='outbox_user_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Notification {self.id} for order {self.order_id}"
+    
+    def as_message(self):
+        """The message as delivered, carrying its sequence id as the replay cursor"""
+        return {'id': self.id, **self.message}
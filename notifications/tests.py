@@ -1,3 +1,320 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from orders.models import Order
+from users import principal
+from users.principal import build_principal
+from .consumers import OrderNotificationConsumer, missed_notifications
+from .delivery import SendBuffer, delivery_stats
+from .models import NotificationOutbox
+from .dispatch import NotificationDispatcher, dispatcher, user_group
+from .middleware import get_user_from_token
+
+User = get_user_model()
+
+
+class OrderNotificationDispatchTests(TestCase):
+    """Status notifications are sent after commit, coalesced and batched per user"""
+
+    def setUp(self):
+        patcher = mock.patch.object(dispatcher, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        dispatcher.drain()
+        self.layer = mock.Mock(group_send=mock.AsyncMock())
+        layer_patcher = mock.patch('notifications.dispatch.get_channel_layer', return_value=self.layer)
+        layer_patcher.start()
+        self.addCleanup(layer_patcher.stop)
+
+        self.user = User.objects.create_user(email='watcher@example.com', password='pass12345')
+        self.orders = [
+            Order.objects.create(user=self.user, total_price=Decimal('5.00'), shipping_address='Here', phone='1')
+            for _ in range(2)
+        ]
+
+    def set_status(self, order, status):
+        order = Order.objects.get(pk=order.pk)
+        order.status = status
+        order.save()
+
+    def test_only_real_transitions_are_queued_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.set_status(self.orders[0], 'pending')
+            self.set_status(self.orders[0], 'shipped')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(dispatcher.drain(), 1)
+        self.layer.group_send.assert_awaited_once_with(f'user_{self.user.id}', {
+            'type': 'order_notification',
+            'message': {
+                'id': NotificationOutbox.objects.get().id,
+                'order_id': self.orders[0].id,
+                'status': 'shipped',
+                'message': f'Your order #{self.orders[0].id} status has been updated to Shipped.',
+            },
+        })
+
+    def test_updates_are_coalesced_into_one_send_per_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set_status(self.orders[0], 'shipped')
+            self.set_status(self.orders[0], 'delivered')
+            self.set_status(self.orders[1], 'shipped')
+        self.assertEqual(dispatcher.drain(), 2)
+        self.layer.group_send.assert_awaited_once()
+        event = self.layer.group_send.await_args.args[1]
+        self.assertEqual(event['type'], 'order_notifications')
+        self.assertEqual([message['status'] for message in event['messages']], ['delivered', 'shipped'])
+
+
+class TokenAuthMiddlewareTests(TransactionTestCase):
+    """WebSocket handshakes resolve cached principals from in-process token checks"""
+
+    def setUp(self):
+        cache.clear()
+        principal._local.clear()
+        self.user = User.objects.create_user(email='socket@example.com', password='pass12345')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def resolve(self, token):
+        return async_to_sync(get_user_from_token)(token)
+
+    def test_reconnects_do_not_query_the_database(self):
+        user = self.resolve(self.token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertFalse(user.is_staff)
+        self.assertEqual(user.get_deferred_fields(), {
+            field.attname for field in User._meta.concrete_fields
+        } - set(principal.PRINCIPAL_FIELDS))
+
+        with mock.patch.object(principal, '_aload_principal_fields') as load:
+            for _ in range(20):
+                self.assertEqual(self.resolve(self.token).pk, self.user.pk)
+        load.assert_not_called()
+
+        # Another worker with a cold local cache is served by the shared cache
+        principal._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(principal.load_principal_fields(self.user.pk), (self.user.pk, True, False))
+
+    def test_invalid_token_is_anonymous_without_lookup(self):
+        with mock.patch.object(principal, '_aload_principal_fields') as load:
+            self.assertTrue(self.resolve('not-a-token').is_anonymous)
+        load.assert_not_called()
+
+    def test_saving_the_user_drops_the_cached_principal(self):
+        self.assertFalse(self.resolve(self.token).is_anonymous)
+        self.user.is_active = False
+        self.user.save()
+        self.assertTrue(self.resolve(self.token).is_anonymous)
+
+        self.user.is_active = True
+        self.user.save()
+        self.user.delete()
+        self.assertTrue(self.resolve(self.token).is_anonymous)
+
+    def test_load_racing_a_change_does_not_cache_the_old_row(self):
+        stale_row = (self.user.pk, True, False)
+
+        def read_then_deactivate(*args, **kwargs):
+            # The row is read, then the user is deactivated before the load caches it
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+            return stale_row
+
+        with mock.patch('django.db.models.query.QuerySet.first', side_effect=read_then_deactivate):
+            self.assertFalse(self.resolve(self.token).is_anonymous)
+        self.assertTrue(self.resolve(self.token).is_anonymous)
+        self.assertEqual(principal.load_principal_fields(self.user.pk), (self.user.pk, False, False))
+
+
+class NotificationDeliveryTests(TestCase):
+    """Each connection drains a bounded, coalescing buffer"""
+
+    def setUp(self):
+        delivery_stats.reset_local()
+        self.addCleanup(delivery_stats.reset_local)
+
+    def test_buffer_coalesces_per_order_and_drops_oldest(self):
+        buffer = SendBuffer(maxsize=2)
+        self.assertEqual(buffer.put({'order_id': 1, 'status': 'processing'}), 'queued')
+        self.assertEqual(buffer.put({'order_id': 2, 'status': 'processing'}), 'queued')
+        self.assertEqual(buffer.put({'order_id': 1, 'status': 'shipped'}), 'coalesced')
+        self.assertEqual(buffer.put({'order_id': 3, 'status': 'processing'}), 'dropped')
+        self.assertEqual(len(buffer), 2)
+
+        async def drain():
+            return [await buffer.get(), await buffer.get()]
+        self.assertEqual(async_to_sync(drain)(), [
+            {'order_id': 1, 'status': 'shipped'},
+            {'order_id': 3, 'status': 'processing'},
+        ])
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(OrderNotificationConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = build_principal(42, True, False)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_messages_are_delivered_and_counted(self):
+        communicator = await self.connect()
+        self.assertEqual(delivery_stats.snapshot()['connections'], 1)
+        await get_channel_layer().group_send(user_group(42), NotificationDispatcher.event([
+            {'order_id': 1, 'status': 'shipped'}, {'order_id': 2, 'status': 'delivered'},
+        ]))
+        self.assertEqual(await communicator.receive_json_from(), {'order_id': 1, 'status': 'shipped'})
+        self.assertEqual(await communicator.receive_json_from(), {'order_id': 2, 'status': 'delivered'})
+        await communicator.disconnect()
+
+        snapshot = delivery_stats.snapshot()
+        self.assertEqual((snapshot['connections'], snapshot['queued_messages'], snapshot['sent']), (0, 0, 2))
+
+    async def test_stalled_client_is_disconnected(self):
+        async def stalled_send(consumer, text_data=None, bytes_data=None, close=False):
+            await asyncio.sleep(1)
+
+        with mock.patch('notifications.consumers.SEND_TIMEOUT', 0.01), \
+                mock.patch.object(OrderNotificationConsumer, 'send', stalled_send):
+            communicator = await self.connect()
+            await get_channel_layer().group_send(user_group(42), NotificationDispatcher.event([{'order_id': 1}]))
+            output = await communicator.receive_output()
+        self.assertEqual(output['type'], 'websocket.close')
+        self.assertEqual(delivery_stats.snapshot()['slow_disconnects'], 1)
+        await communicator.disconnect()
+
+    async def test_client_that_stops_acking_is_disconnected(self):
+        # Under Daphne send() never blocks; the unacked window is what bounds a stalled client
+        with mock.patch('notifications.consumers.SEND_TIMEOUT', 0.05), \
+                mock.patch('notifications.consumers.UNACKED_LIMIT', 1):
+            communicator = await self.connect()
+            await get_channel_layer().group_send(user_group(42), NotificationDispatcher.event([
+                {'id': 1, 'order_id': 1}, {'id': 2, 'order_id': 2}, {'id': 3, 'order_id': 3},
+            ]))
+            self.assertEqual((await communicator.receive_json_from())['id'], 1)
+            self.assertTrue(await communicator.receive_nothing(0.02))
+            await communicator.send_json_to({'ack': 1})
+            self.assertEqual((await communicator.receive_json_from())['id'], 2)
+            output = await communicator.receive_output()
+        self.assertEqual(output['type'], 'websocket.close')
+        self.assertEqual(delivery_stats.snapshot()['slow_disconnects'], 1)
+        await communicator.disconnect()
+
+    async def test_stats_are_published_on_a_timer(self):
+        with mock.patch.object(delivery_stats, 'publish_interval', 0.05):
+            communicator = await self.connect()
+            await get_channel_layer().group_send(user_group(42), NotificationDispatcher.event([{'order_id': 1}]))
+            await communicator.receive_json_from()
+            await asyncio.sleep(0.2)
+            published = await cache.aget(delivery_stats.worker_key)
+            await communicator.disconnect()
+        self.assertEqual((published['connections'], published['sent']), (1, 1))
+
+    def test_stats_endpoint_is_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='shopper@example.com', password='pass12345'))
+        self.assertEqual(client.get('/api/notifications/stats/').status_code, 403)
+        client.force_authenticate(User.objects.create_user(
+            email='staff@example.com', password='pass12345', is_staff=True,
+        ))
+        response = client.get('/api/notifications/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['connections'], 0)
+
+
+class NotificationOutboxTests(TestCase):
+    """Status changes are logged with the order and replayed on reconnect"""
+
+    def setUp(self):
+        patcher = mock.patch.object(dispatcher, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(dispatcher.drain)
+        delivery_stats.reset_local()
+        self.user = User.objects.create_user(email='offline@example.com', password='pass12345')
+        self.orders = [
+            Order.objects.create(user=self.user, total_price=Decimal('5.00'), shipping_address='Here', phone='1')
+            for _ in range(2)
+        ]
+
+    def set_status(self, order, status):
+        order = Order.objects.get(pk=order.pk)
+        order.status = status
+        order.save()
+
+    def test_entries_share_the_order_transaction(self):
+        self.assertFalse(NotificationOutbox.objects.exists())
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.set_status(self.orders[0], 'shipped')
+            self.assertEqual(NotificationOutbox.objects.count(), 1)
+            raise RuntimeError
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    async def test_reconnect_replays_missed_updates(self):
+        await database_sync_to_async(self.set_status)(self.orders[0], 'shipped')
+        seen = await NotificationOutbox.objects.alast()
+        await database_sync_to_async(self.set_status)(self.orders[0], 'delivered')
+        await database_sync_to_async(self.set_status)(self.orders[1], 'shipped')
+
+        communicator = WebsocketCommunicator(
+            OrderNotificationConsumer.as_asgi(), f'/ws/notifications/?last_seen={seen.id}',
+        )
+        communicator.scope['user'] = build_principal(self.user.id, True, False)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        replayed = [await communicator.receive_json_from(), await communicator.receive_json_from()]
+        self.assertEqual([(message['order_id'], message['status']) for message in replayed], [
+            (self.orders[0].id, 'delivered'), (self.orders[1].id, 'shipped'),
+        ])
+        self.assertTrue(all(message['id'] > seen.id for message in replayed))
+
+        # Live copies of replayed entries are not sent twice
+        await get_channel_layer().group_send(user_group(self.user.id), NotificationDispatcher.event(replayed))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_replay_covers_ids_committed_out_of_order(self):
+        await database_sync_to_async(self.set_status)(self.orders[0], 'shipped')
+        await database_sync_to_async(self.set_status)(self.orders[1], 'shipped')
+        # The client got the second entry before the first one committed
+        first, seen = [entry async for entry in NotificationOutbox.objects.all()]
+        replayed = await missed_notifications(self.user.id, seen.id, 10)
+        self.assertEqual([message['id'] for message in replayed], [first.id])
+
+        await NotificationOutbox.objects.filter(pk=first.pk).aupdate(created_at=seen.created_at - timedelta(minutes=1))
+        self.assertEqual(await missed_notifications(self.user.id, seen.id, 10), [])
+
+    async def test_truncated_replay_starts_with_resync(self):
+        for status in ('processing', 'shipped', 'delivered'):
+            await database_sync_to_async(self.set_status)(self.orders[0], status)
+        replayed = await missed_notifications(self.user.id, 0, 2)
+        self.assertEqual(replayed[0], {'type': 'resync'})
+        self.assertEqual([message['status'] for message in replayed[1:]], ['delivered'])
+
+    def test_prune_compacts_superseded_and_expired_entries(self):
+        self.set_status(self.orders[1], 'shipped')
+        NotificationOutbox.objects.update(created_at=timezone.now() - timedelta(days=40))
+        self.set_status(self.orders[0], 'shipped')
+        self.set_status(self.orders[0], 'delivered')
+
+        output = StringIO()
+        call_command('prune_notification_outbox', '--days', '30', stdout=output)
+        self.assertIn('Compacted 1 superseded and deleted 1 expired', output.getvalue())
+        self.assertEqual(
+            list(NotificationOutbox.objects.values_list('order_id', 'message__status')),
+            [(self.orders[0].id, 'delivered')],
+        )
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import DeliveryStatsView
+
+urlpatterns = [
+    path('stats/', DeliveryStatsView.as_view(), name='notification-stats'),
+]
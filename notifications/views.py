@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .delivery import delivery_stats
+
+
+class DeliveryStatsView(APIView):
+    """WebSocket connections, queued messages and drops per worker (staff only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(delivery_stats.report())
@@ -1,7 +1,21 @@
 from django.contrib import admin
 from .models import Order, OrderItem, Cart, CartItem
 # Register your models here.
-admin.site.register(Order)
-admin.site.register(OrderItem)
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status', 'total_price', 'created_at']
+    list_filter = ['status']
+    # Order.__str__ reads the user's email
+    list_select_related = ['user']
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    # OrderItem.__str__ reads the product name
+    list_select_related = ['product']
+
+
 admin.site.register(Cart)
 admin.site.register(CartItem)
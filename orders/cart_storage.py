@@ -0,0 +1,208 @@
+"""Cart storage engines.
+
+``CartItemViewSet.create`` (the "+1 quantity" click) goes through the
+configured engine instead of writing ``CartItem`` rows directly:
+
+* ``DatabaseCartStorage`` (default) writes straight to ``Cart``/``CartItem``.
+* ``RedisCartStorage`` keeps each cart in a Redis hash and writes behind to
+  the database: carts are materialized when the user reads the cart, edits
+  a line, checks out, or when ``manage.py flush_cart_writes`` drains the
+  queue of dirty carts in batches.
+
+Select the engine with ``CART_STORAGE_BACKEND`` (a dotted path).
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from products.models import Product
+from .models import Cart, CartItem
+
+DEFAULT_CART_STORAGE_BACKEND = 'orders.cart_storage.DatabaseCartStorage'
+
+
+class BaseCartStorage:
+    """Interface for cart storage engines"""
+
+    def get_quantity(self, user, product_id):
+        """Return the quantity of ``product_id`` currently in the user's cart"""
+        raise NotImplementedError
+
+    def add_item(self, user, product, quantity):
+        """Add ``quantity`` of ``product`` to the cart and return the CartItem.
+
+        The returned item may be unsaved (``id`` is None) for write-behind
+        engines.
+        """
+        raise NotImplementedError
+
+    def clear(self, user):
+        """Remove every item from the user's cart"""
+        raise NotImplementedError
+
+    def materialize(self, user):
+        """Write any pending changes of the user's cart to the database"""
+
+    def invalidate(self, user):
+        """Forget engine state after the cart rows were changed in the database"""
+
+    def flush_pending(self, limit=None):
+        """Write up to ``limit`` pending carts to the database; return how many"""
+        return 0
+
+
+class DatabaseCartStorage(BaseCartStorage):
+    """Store carts directly in the Cart/CartItem tables"""
+
+    def get_quantity(self, user, product_id):
+        item = CartItem.objects.filter(cart__user=user, product_id=product_id).only('quantity').first()
+        return item.quantity if item else 0
+
+    def add_item(self, user, product, quantity):
+        cart, created = Cart.objects.get_or_create(user=user)
+        item = None if created else CartItem.objects.filter(cart=cart, product=product).first()
+        if item is None:
+            item = CartItem(cart=cart, product=product, quantity=0)
+        else:
+            item.product = product
+        item.quantity += quantity
+        item.save()
+        return item
+
+    def clear(self, user):
+        cart = Cart.objects.filter(user=user).first()
+        if cart is not None:
+            cart.clear()
+
+
+class RedisCartStorage(BaseCartStorage):
+    """Keep carts in Redis hashes (product id -> quantity) and write behind.
+
+    A hash is seeded from the database on first use, after which adding to
+    the cart costs one ``HINCRBY`` and one ``SADD`` to the dirty set and no
+    database write.
+    """
+    key_prefix = 'cart'
+    dirty_key = 'cart:dirty'
+    seeded_field = '_seeded'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection(getattr(settings, 'CART_STORAGE_REDIS_ALIAS', 'default'))
+        return self._client
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def _ensure_seeded(self, user):
+        key = self._key(user.pk)
+        if self.client.hexists(key, self.seeded_field):
+            return key
+        rows = CartItem.objects.filter(cart__user=user).values_list('product_id', 'quantity')
+        pipeline = self.client.pipeline(transaction=True)
+        for product_id, quantity in rows:
+            # HSETNX keeps increments made by a concurrent first request
+            pipeline.hsetnx(key, product_id, quantity)
+        pipeline.hset(key, self.seeded_field, 1)
+        pipeline.execute()
+        return key
+
+    def get_quantity(self, user, product_id):
+        key = self._ensure_seeded(user)
+        return int(self.client.hget(key, product_id) or 0)
+
+    def add_item(self, user, product, quantity):
+        key = self._ensure_seeded(user)
+        total = self.client.hincrby(key, product.pk, quantity)
+        self.client.sadd(self.dirty_key, user.pk)
+        return CartItem(product=product, quantity=total)
+
+    def clear(self, user):
+        key = self._key(user.pk)
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(key)
+        pipeline.hset(key, self.seeded_field, 1)
+        pipeline.sadd(self.dirty_key, user.pk)
+        pipeline.execute()
+
+    def materialize(self, user):
+        # Clear the dirty flag before reading so a concurrent add re-flags it
+        if self.client.srem(self.dirty_key, user.pk):
+            self._write_cart(user.pk)
+
+    def invalidate(self, user):
+        # Re-seed from the database on next use; the rows are current, so
+        # nothing is left to flush
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(self._key(user.pk))
+        pipeline.srem(self.dirty_key, user.pk)
+        pipeline.execute()
+
+    def flush_pending(self, limit=None):
+        user_ids = self.client.spop(self.dirty_key, limit or 100)
+        for user_id in user_ids:
+            self._write_cart(int(user_id))
+        return len(user_ids)
+
+    def _write_cart(self, user_id):
+        try:
+            entries = self.client.hgetall(self._key(user_id))
+            if self.seeded_field not in entries and self.seeded_field.encode() not in entries:
+                # Invalidated or expired: the database rows are the cart
+                return
+            quantities = {}
+            for field, value in entries.items():
+                field = field.decode() if isinstance(field, bytes) else field
+                if field != self.seeded_field and int(value) > 0:
+                    quantities[int(field)] = int(value)
+            with transaction.atomic():
+                self._sync_rows(user_id, quantities)
+        except Exception:
+            # Keep the cart queued so the next flush retries it
+            self.client.sadd(self.dirty_key, user_id)
+            raise
+
+    def _sync_rows(self, user_id, quantities):
+        """Make the CartItem rows of a cart match ``quantities`` in bulk"""
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        existing = {} if created else {item.product_id: item for item in cart.items.all()}
+
+        stale = [item.pk for product_id, item in existing.items() if product_id not in quantities]
+        if stale:
+            CartItem.objects.filter(pk__in=stale).delete()
+
+        changed = []
+        for product_id, item in existing.items():
+            if product_id in quantities and item.quantity != quantities[product_id]:
+                item.quantity = quantities[product_id]
+                changed.append(item)
+        if changed:
+            CartItem.objects.bulk_update(changed, ['quantity'])
+
+        new_ids = [product_id for product_id in quantities if product_id not in existing]
+        if new_ids:
+            # Skip products deleted since they were added
+            live_ids = Product.objects.filter(pk__in=new_ids).values_list('pk', flat=True)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product_id=product_id, quantity=quantities[product_id])
+                for product_id in live_ids
+            )
+
+        if stale or changed or new_ids:
+            cart.recalculate_totals()
+
+
+_storage = {}
+
+
+def get_cart_storage():
+    """Return the configured cart storage engine"""
+    path = getattr(settings, 'CART_STORAGE_BACKEND', DEFAULT_CART_STORAGE_BACKEND)
+    if path not in _storage:
+        _storage[path] = import_string(path)()
+    return _storage[path]
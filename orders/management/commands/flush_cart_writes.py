@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.cart_storage import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = 'Write pending cart changes from the write-behind cart storage to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Carts written per batch')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, sleeping this many seconds between empty batches')
+
+    def handle(self, *args, **options):
+        storage = get_cart_storage()
+        total = 0
+        while True:
+            written = storage.flush_pending(options['batch_size'])
+            total += written
+            if written:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} cart(s).'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from orders.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Recompute Cart running totals from cart items and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted carts without fixing them')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        money = DecimalField(max_digits=12, decimal_places=2)
+        carts = Cart.objects.annotate(
+            items_subtotal=Coalesce(
+                Sum(F('items__quantity') * F('items__product__price'), output_field=money),
+                Value(Decimal('0.00')),
+                output_field=money,
+            ),
+            items_lines=Count('items'),
+            items_quantity=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+
+        drifted = []
+        for cart in carts.iterator(chunk_size=options['batch_size']):
+            actual = (cart.items_subtotal, cart.items_lines, cart.items_quantity)
+            if (cart.subtotal, cart.line_count, cart.quantity_total) != actual:
+                cart.subtotal, cart.line_count, cart.quantity_total = actual
+                drifted.append(cart)
+
+        if drifted and not options['dry_run']:
+            Cart.objects.bulk_update(
+                drifted, ['subtotal', 'line_count', 'quantity_total'], batch_size=options['batch_size']
+            )
+
+        verb = 'Found' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drifted)} cart(s) with drifted totals.'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 20:32
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('orders', 'Cart')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    carts = list(Cart.objects.annotate(
+        items_subtotal=Coalesce(
+            Sum(F('items__quantity') * F('items__product__price'), output_field=money),
+            Value(Decimal('0.00')),
+            output_field=money,
+        ),
+        items_lines=Count('items'),
+        items_quantity=Coalesce(Sum('items__quantity'), Value(0)),
+    ))
+    for cart in carts:
+        cart.subtotal = cart.items_subtotal
+        cart.line_count = cart.items_lines
+        cart.quantity_total = cart.items_quantity
+    Cart.objects.bulk_update(carts, ['subtotal', 'line_count', 'quantity_total'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='quantity_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(populate_cart_totals, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,21 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-import json
+from notifications.dispatch import notify_order_status
 
 class Cart(models.Model):
     """Shopping cart model"""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
+    # Running totals, maintained incrementally by CartItem.save()/delete()
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    line_count = models.PositiveIntegerField(default=0)
+    quantity_total = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -18,13 +24,38 @@ class Cart(models.Model):
     
     @property
     def total_price(self):
-        """Calculate total price of all items in cart"""
-        return sum(item.total_price for item in self.items.all())
+        """Total price of all items in cart"""
+        return self.subtotal
     
     @property
     def item_count(self):
-        """Count number of items in cart"""
-        return self.items.count()
+        """Number of distinct items in cart"""
+        return self.line_count
+    
+    def apply_totals_delta(self, subtotal=0, lines=0, quantity=0):
+        """Shift the running totals with a single UPDATE"""
+        Cart.objects.filter(pk=self.pk).update(
+            subtotal=F('subtotal') + subtotal,
+            line_count=F('line_count') + lines,
+            quantity_total=F('quantity_total') + quantity,
+            updated_at=timezone.now(),
+        )
+        self.subtotal += subtotal
+        self.line_count += lines
+        self.quantity_total += quantity
+    
+    def recalculate_totals(self):
+        """Recompute the running totals from the cart items"""
+        totals = self.items.aggregate(**CART_TOTALS)
+        for field, value in totals.items():
+            setattr(self, field, value)
+        self.save(update_fields=[*totals, 'updated_at'])
+    
+    def clear(self):
+        """Remove every item from the cart"""
+        self.items.all().delete()
+        self.subtotal, self.line_count, self.quantity_total = Decimal('0.00'), 0, 0
+        self.save(update_fields=['subtotal', 'line_count', 'quantity_total', 'updated_at'])
 
 class CartItem(models.Model):
     """Individual item in a shopping cart"""
@@ -40,10 +71,53 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.cart}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored line so save()/delete() can apply deltas
+        instance._loaded_line = (instance.__dict__.get('product_id'), instance.__dict__.get('quantity'))
+        return instance
+    
     @property
     def total_price(self):
         """Calculate total price for this cart item"""
         return self.product.price * self.quantity
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        loaded = getattr(self, '_loaded_line', (None, None))
+        # The line and the running totals are written together or not at all
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(CartItem, instance=self), savepoint=False):
+            super().save(*args, **kwargs)
+            
+            if adding:
+                self.cart.apply_totals_delta(self.total_price, 1, self.quantity)
+            elif loaded[0] == self.product_id and loaded[1] is not None:
+                change = self.quantity - loaded[1]
+                if change:
+                    self.cart.apply_totals_delta(self.product.price * change, 0, change)
+            else:
+                # The line switched product or was never loaded: start over
+                self.cart.recalculate_totals()
+        self._loaded_line = (self.product_id, self.quantity)
+    
+    def delete(self, *args, **kwargs):
+        quantity = getattr(self, '_loaded_line', (None, self.quantity))[1]
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(CartItem, instance=self), savepoint=False):
+            result = super().delete(*args, **kwargs)
+            self.cart.apply_totals_delta(-self.product.price * quantity, -1, -quantity)
+        return result
+
+# Aggregates matching the Cart running totals, relative to CartItem
+CART_TOTALS = {
+    'subtotal': Coalesce(
+        Sum(F('quantity') * F('product__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+        Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    ),
+    'line_count': Count('id'),
+    'quantity_total': Coalesce(Sum('quantity'), Value(0)),
+}
 
 class Order(models.Model):
     """Order model for purchases"""
@@ -63,9 +137,28 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Order history: filtered by user, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # Staff order list
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.id} - {self.user.email} - {self.status}"
+    
+    def save(self, *args, **kwargs):
+        # The status notification (post_save) is recorded in the same transaction
+        using = kwargs.get('using') or router.db_for_write(Order, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as stored, to notify only on real transitions
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
 class OrderItem(models.Model):
     """Individual item in an order"""
@@ -75,7 +168,7 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Store price at time of purchase
     
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} in Order {self.order.id}"
+        return f"{self.quantity} x {self.product.name} in Order {self.order_id}"
     
     @property
     def total_price(self):
@@ -84,18 +177,23 @@ class OrderItem(models.Model):
 
 @receiver(post_save, sender=Order)
 def order_status_change_notification(sender, instance, created, **kwargs):
-    """Send notification when order status changes"""
-    if not created:  # Only for status updates, not new orders
-        channel_layer = get_channel_layer()
-        # Send notification to the user's channel group
-        async_to_sync(channel_layer.group_send)(
-            f"user_{instance.user.id}",
-            {
-                "type": "order_notification",
-                "message": {
-                    "order_id": instance.id,
-                    "status": instance.status,
-                    "message": f"Your order #{instance.id} status has been updated to {instance.get_status_display()}."
-                }
-            }
-        )
\ No newline at end of file
+    """Notify the customer when an existing order changes status"""
+    if 'status' not in instance.__dict__:
+        # Status was deferred and therefore not saved
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or previous == instance.status:
+        return
+    # Sent after commit, batched, from a background thread
+    notify_order_status(instance)
+
+@receiver(post_save, sender=Product)
+def refresh_cart_subtotals(sender, instance, created, **kwargs):
+    """Re-price carts holding a product after it is saved (its price may have changed)"""
+    if created:
+        return
+    line_totals = CartItem.objects.filter(cart=OuterRef('pk')).values('cart').annotate(
+        total=CART_TOTALS['subtotal']
+    ).values('total')
+    Cart.objects.filter(items__product=instance).update(subtotal=Subquery(line_totals))
\ No newline at end of file
@@ -1,7 +1,12 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import Cart, CartItem, Order, OrderItem
+from .services import reserve_stock
+from .cart_storage import get_cart_storage
 from products.models import Product
 from products.serializers import ProductSerializer
+from ecommerce_project.sparse_fields import SparseFieldsetSerializerMixin
+from tasks.queue import enqueue
 
 class CartItemSerializer(serializers.ModelSerializer):
     """Serializer for cart items"""
@@ -24,21 +29,17 @@ class CartItemSerializer(serializers.ModelSerializer):
     
     def validate(self, attrs):
         """Validate that product has enough stock"""
-        cart = self.context['cart']
-        product = attrs['product']
-        quantity = attrs.get('quantity', 1)
-        
-        # For updates, add current quantity
         instance = self.instance
-        if instance and instance.product == product:
-            quantity += instance.quantity
+        # Partial updates may omit the product or the quantity
+        product = attrs.get('product') or instance.product
+        quantity = attrs.get('quantity', instance.quantity if instance else 1)
             
         if product.stock < quantity:
             raise serializers.ValidationError(f"Not enough stock available. Only {product.stock} remaining.")
         
         return attrs
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for shopping cart"""
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -46,8 +47,10 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = ['id', 'items', 'total_price', 'item_count', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'items', 'total_price', 'item_count', 'quantity_total', 'created_at', 'updated_at']
+        read_only_fields = ['quantity_total', 'created_at', 'updated_at']
+        # Columns behind the running-total properties
+        projection_sources = {'total_price': ['subtotal'], 'item_count': ['line_count']}
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """Serializer for order items"""
@@ -58,7 +61,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_details', 'quantity', 'price', 'total_price']
         read_only_fields = ['price', 'total_price']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for orders"""
     items = OrderItemSerializer(many=True, read_only=True)
     
@@ -68,6 +71,15 @@ class OrderSerializer(serializers.ModelSerializer):
                  'phone', 'created_at', 'updated_at']
         read_only_fields = ['user', 'total_price', 'created_at', 'updated_at']
 
+class OrderSummarySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Compact order representation for history listings (?fields=summary)"""
+    item_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Order
+        fields = ['id', 'user', 'item_count', 'total_price', 'status', 'created_at', 'updated_at']
+        read_only_fields = fields
+
 class CreateOrderSerializer(serializers.ModelSerializer):
     """Serializer for creating a new order"""
     class Meta:
@@ -77,41 +89,49 @@ class CreateOrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context['request'].user
         
-        # Get the user's cart
-        try:
-            cart = Cart.objects.get(user=user)
-        except Cart.DoesNotExist:
-            raise serializers.ValidationError("You don't have any items in your cart.")
+        # Write-behind cart engines flush the cart to the database first
+        storage = get_cart_storage()
+        storage.materialize(user)
         
-        # Check if cart has items
-        if cart.items.count() == 0:
+        # Load the whole cart, with products, in a single query
+        cart_items = list(CartItem.objects.filter(cart__user=user).select_related('cart', 'product'))
+        if not cart_items:
+            if not Cart.objects.filter(user=user).exists():
+                raise serializers.ValidationError("You don't have any items in your cart.")
             raise serializers.ValidationError("Your cart is empty.")
         
-        # Create the order
-        order = Order.objects.create(
-            user=user,
-            total_price=cart.total_price,
-            shipping_address=validated_data['shipping_address'],
-            phone=validated_data['phone'],
-            status='pending'
-        )
-        
-        # Create order items and update product stock
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
+        # Raises StockReservationError, rolling back the whole order, if any
+        # line cannot be covered by stock
+        with transaction.atomic():
+            # Create the order
+            order = Order.objects.create(
+                user=user,
+                total_price=sum(item.product.price * item.quantity for item in cart_items),
+                shipping_address=validated_data['shipping_address'],
+                phone=validated_data['phone'],
+                status='pending'
             )
             
-            # Update product stock
-            product = cart_item.product
-            product.stock -= cart_item.quantity
-            product.save()
-        
-        # Clear the cart
-        cart.items.all().delete()
+            # Create order items
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=cart_item.product,
+                    quantity=cart_item.quantity,
+                    price=cart_item.product.price
+                )
+                for cart_item in cart_items
+            ])
+            
+            # Reserve stock for every line in one conditional update
+            reserve_stock((cart_item.product_id, cart_item.quantity) for cart_item in cart_items)
+            
+            # Clear the cart, and the engine's copy once the order is committed
+            cart_items[0].cart.clear()
+            transaction.on_commit(lambda: storage.invalidate(user))
+            
+            # Everything else runs in the background worker
+            enqueue('orders.order_placed', {'order_id': order.id}, idempotency_key=f'orders.order_placed:{order.id}')
         
         return order
 
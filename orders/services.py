@@ -0,0 +1,91 @@
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from products.models import Product
+
+
+class StockReservationError(Exception):
+    """Raised when one or more order lines cannot be covered by stock"""
+
+    def __init__(self, failures):
+        super().__init__('Not enough stock available.')
+        # [{'product_id': ..., 'product_name': ..., 'requested': ..., 'available': ...}]
+        self.failures = failures
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def reserve_stock(lines):
+    """Atomically decrement stock for ``lines`` of ``(product_id, quantity)``.
+
+    All lines are reserved by a single conditional statement::
+
+        UPDATE product SET stock = stock - CASE id WHEN ... END
+        WHERE (id = a AND stock >= qa) OR (id = b AND stock >= qb) ...
+
+    so concurrent checkouts can never oversell and the cost does not grow
+    with the number of lines. Where the database has row locks, the rows are
+    first locked in pk order so overlapping checkouts cannot deadlock. If fewer rows
+    than lines were updated the statement is rolled back and
+    ``StockReservationError`` lists the short lines. Must run inside the
+    checkout's ``transaction.atomic()`` so the order rolls back with it.
+    """
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    if not quantities:
+        return
+
+    covered = Q()
+    decrement = []
+    for product_id, quantity in quantities.items():
+        covered |= Q(pk=product_id, stock__gte=quantity)
+        decrement.append(When(pk=product_id, then=F('stock') - quantity))
+
+    try:
+        with transaction.atomic():
+            _lock_in_pk_order(quantities)
+            # Stock-only write: leaves the catalog cache alone
+            updated = Product.objects.filter(covered).update_stock(
+                Case(*decrement, default=F('stock'), output_field=PositiveIntegerField())
+            )
+            if updated != len(quantities):
+                raise _Shortfall
+    except _Shortfall:
+        raise StockReservationError(_describe_failures(quantities))
+
+
+def _lock_in_pk_order(quantities):
+    """Lock the products in ascending pk order before the multi-row UPDATE.
+
+    The UPDATE locks rows in whatever order the plan visits them, so two
+    checkouts with overlapping carts could each hold a row the other needs.
+    Taking the locks in one global order first rules that deadlock out.
+    Databases without row locks (SQLite) serialize writers anyway.
+    """
+    alias = router.db_for_write(Product)
+    if not connections[alias].features.has_select_for_update:
+        return
+    list(
+        Product.objects.using(alias).select_for_update().filter(pk__in=list(quantities))
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def _describe_failures(quantities):
+    products = Product.objects.in_bulk(list(quantities))
+    failures = []
+    for product_id, requested in sorted(quantities.items()):
+        product = products.get(product_id)
+        available = product.stock if product else 0
+        if available < requested:
+            failures.append({
+                'product_id': product_id,
+                'product_name': product.name if product else None,
+                'requested': requested,
+                'available': available,
+            })
+    return failures
@@ -0,0 +1,18 @@
+import time
+
+from django.conf import settings
+
+from tasks.queue import enqueue, task
+
+
+@task('orders.order_placed')
+def order_placed(order_id):
+    """Side effects of a checkout that do not need to hold up the response"""
+    # Coalesce catalog refreshes: at most one per interval, at its end
+    interval = getattr(settings, 'CATALOG_STOCK_REFRESH_INTERVAL', 30)
+    window = int(time.time() // interval)
+    enqueue(
+        'products.refresh_catalog',
+        idempotency_key=f'products.refresh_catalog:{interval}:{window}',
+        delay=(window + 1) * interval - time.time(),
+    )
@@ -1,3 +1,289 @@
+import base64
+import json
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.cache import PRODUCT_NAMESPACE, get_generation
+from products.models import Category, Product
+from tasks.models import Task
+from tasks.queue import run_pending
+from .cart_storage import RedisCartStorage
+from .models import Cart, CartItem, Order
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+User = get_user_model()
+
+
+class CheckoutTests(TestCase):
+    """Placing an order through CreateOrderSerializer"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Garden')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def add_product(self, name, stock, quantity, price='10.00'):
+        product = Product.objects.create(
+            name=name, description=name, price=Decimal(price), stock=stock, category=self.category,
+        )
+        CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+        return product
+
+    def checkout(self):
+        return self.client.post('/api/orders/orders/', {'shipping_address': '1 Main St', 'phone': '555-0100'})
+
+    def test_checkout_decrements_stock_and_clears_cart(self):
+        spade = self.add_product('Spade', stock=5, quantity=2)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        spade.refresh_from_db()
+        self.assertEqual(spade.stock, 3)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_insufficient_stock_rolls_back_the_whole_order(self):
+        rake = self.add_product('Rake', stock=5, quantity=1)
+        self.add_product('Hose', stock=1, quantity=3)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(item['product_name'], item['requested'], item['available']) for item in response.json()['items']],
+            [('Hose', 3, 1)],
+        )
+        rake.refresh_from_db()
+        self.assertEqual(rake.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_checkout_defers_catalog_refresh(self):
+        self.add_product('Spade', stock=5, quantity=1)
+        generation = get_generation(PRODUCT_NAMESPACE)
+        self.assertEqual(self.checkout().status_code, 201)
+        # Reserving stock leaves the catalog cache alone
+        self.assertEqual(get_generation(PRODUCT_NAMESPACE), generation)
+        self.add_product('Rake', stock=5, quantity=1)
+        self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(Task.objects.filter(name='orders.order_placed').count(), 2)
+        generation = get_generation(PRODUCT_NAMESPACE)
+
+        # Both orders share one catalog refresh, due at the end of the window
+        with mock.patch('orders.tasks.time.time', return_value=1000.0):
+            self.assertEqual(run_pending(), (2, 0))
+        refresh = Task.objects.get(name='products.refresh_catalog')
+        self.assertEqual(refresh.status, Task.PENDING)
+        self.assertEqual(get_generation(PRODUCT_NAMESPACE), generation)
+        Task.objects.filter(pk=refresh.pk).update(run_after=timezone.now())
+        with mock.patch('products.tasks.warm_catalog') as warm_catalog, \
+                self.settings(CATALOG_WARM_OPTIONS={'host': 'shop.example.com'}):
+            self.assertEqual(run_pending(), (1, 0))
+        warm_catalog.assert_called_once_with(host='shop.example.com')
+        self.assertNotEqual(get_generation(PRODUCT_NAMESPACE), generation)
+    
+    def count_checkout_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        return len(context)
+
+    def test_checkout_query_count_does_not_grow_with_cart_size(self):
+        self.add_product('Seeds', stock=10, quantity=1)
+        small_cart = self.count_checkout_queries()
+
+        for index in range(50):
+            self.add_product(f'Pot {index}', stock=10, quantity=2)
+        large_cart = self.count_checkout_queries()
+
+        self.assertEqual(small_cart, large_cart)
+        # Includes the INSERT that queues the order_placed task
+        self.assertLessEqual(large_cart, 11)
+
+
+class CartTotalsTests(TestCase):
+    """Cart totals are kept up to date without re-reading the items"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='shopper@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Stationery')
+        self.pen = Product.objects.create(name='Pen', description='Pen', price=Decimal('1.50'),
+                                          stock=50, category=category)
+        self.pad = Product.objects.create(name='Pad', description='Pad', price=Decimal('4.00'),
+                                          stock=50, category=category)
+
+    def cart_totals(self):
+        cart = Cart.objects.get(user=self.user)
+        return cart.subtotal, cart.line_count, cart.quantity_total
+
+    def test_totals_follow_item_changes(self):
+        self.client.post('/api/orders/cart-items/', {'product_id': self.pen.id, 'quantity': 2})
+        self.client.post('/api/orders/cart-items/', {'product_id': self.pad.id, 'quantity': 1})
+        self.assertEqual(self.cart_totals(), (Decimal('7.00'), 2, 3))
+
+        item = CartItem.objects.get(product=self.pen)
+        self.client.patch(f'/api/orders/cart-items/{item.id}/', {'quantity': 4})
+        self.assertEqual(self.cart_totals(), (Decimal('10.00'), 2, 5))
+
+        self.client.delete(f'/api/orders/cart-items/{item.id}/')
+        self.assertEqual(self.cart_totals(), (Decimal('4.00'), 1, 1))
+
+        self.client.delete('/api/orders/cart/clear/')
+        self.assertEqual(self.cart_totals(), (Decimal('0.00'), 0, 0))
+
+    def test_price_change_reprices_carts(self):
+        self.client.post('/api/orders/cart-items/', {'product_id': self.pen.id, 'quantity': 2})
+        self.pen.price = Decimal('2.00')
+        self.pen.save()
+        self.assertEqual(self.cart_totals(), (Decimal('4.00'), 1, 2))
+
+    def test_reading_a_cart_costs_constant_queries(self):
+        self.client.post('/api/orders/cart-items/', {'product_id': self.pen.id, 'quantity': 2})
+        self.client.post('/api/orders/cart-items/', {'product_id': self.pad.id, 'quantity': 1})
+        cart = Cart.objects.get(user=self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/orders/cart/{cart.id}/')
+        self.assertEqual(response.json()['total_price'], '7.00')
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+class RedisCartStorageTests(TestCase):
+    """Cart clicks stay in Redis until the cart is materialized"""
+
+    def setUp(self):
+        cache.clear()
+        self.storage = RedisCartStorage(client=fakeredis.FakeRedis())
+        for target in ('orders.views.get_cart_storage', 'orders.serializers.get_cart_storage'):
+            patcher = mock.patch(target, return_value=self.storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(email='clicker@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Snacks')
+        self.chips = Product.objects.create(name='Chips', description='Chips', price=Decimal('2.00'),
+                                            stock=10, category=category)
+
+    def add_chips(self, quantity=1):
+        return self.client.post('/api/orders/cart-items/', {'product_id': self.chips.id, 'quantity': quantity})
+
+    def test_adds_are_written_behind_in_one_batch(self):
+        for _ in range(3):
+            self.assertEqual(self.add_chips().status_code, 201)
+        self.assertFalse(CartItem.objects.exists())
+
+        self.assertEqual(self.storage.flush_pending(), 1)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.items.get().quantity, 3)
+        self.assertEqual((cart.subtotal, cart.line_count, cart.quantity_total), (Decimal('6.00'), 1, 3))
+
+    def test_stock_check_includes_pending_quantity(self):
+        self.add_chips(8)
+        self.assertEqual(self.add_chips(3).status_code, 400)
+
+    def test_clear_is_written_behind(self):
+        self.add_chips(2)
+        self.storage.flush_pending()
+        self.client.delete('/api/orders/cart/clear/')
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.storage.flush_pending()
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_flush_after_invalidate_keeps_the_rows(self):
+        salsa = Product.objects.create(name='Salsa', description='Salsa', price=Decimal('3.00'),
+                                       stock=10, category=self.chips.category)
+        self.add_chips(2)
+        self.client.post('/api/orders/cart-items/', {'product_id': salsa.id, 'quantity': 1})
+        self.storage.flush_pending()
+        # A "+1" lands between materializing and invalidating the cart
+        self.add_chips()
+        self.storage.invalidate(self.user)
+        self.storage.flush_pending()
+        self.assertEqual(
+            list(CartItem.objects.order_by('product_id').values_list('product_id', 'quantity')),
+            [(self.chips.id, 2), (salsa.id, 1)],
+        )
+        # A hash that is gone, e.g. evicted, is not an empty cart either
+        self.add_chips()
+        self.storage.client.delete(self.storage._key(self.user.pk))
+        self.storage.flush_pending()
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_checkout_empties_the_redis_cart(self):
+        self.add_chips(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/orders/', {'shipping_address': '1 Main St', 'phone': '555-0100'})
+        self.assertEqual(response.status_code, 201)
+
+        salsa = Product.objects.create(name='Salsa', description='Salsa', price=Decimal('3.00'),
+                                       stock=10, category=self.chips.category)
+        self.client.post('/api/orders/cart-items/', {'product_id': salsa.id, 'quantity': 1})
+        self.storage.materialize(self.user)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(list(cart.items.values_list('product_id', 'quantity')), [(salsa.id, 1)])
+
+
+class OrderHistoryTests(TestCase):
+    """The staff order list costs a constant number of queries"""
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def place_orders(self, count):
+        for index in range(count):
+            category = Category.objects.create(name=f'Category {Category.objects.count()}')
+            product = Product.objects.create(name=f'Item {Product.objects.count()}', description='Item',
+                                             price=Decimal('3.00'), stock=5, category=category)
+            buyer = User.objects.create_user(email=f'buyer{User.objects.count()}@example.com', password='x')
+            order = Order.objects.create(user=buyer, total_price=Decimal('6.00'), shipping_address='Here', phone='1')
+            order.items.create(product=product, quantity=2, price=product.price)
+
+    def count_list_queries(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/orders/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.json()
+
+    def test_tampered_cursor_is_not_found(self):
+        self.place_orders(1)
+        cursor = base64.urlsafe_b64encode(json.dumps({'p': ['yesterday', 'x']}).encode()).decode()
+        response = self.client.get('/api/orders/orders/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_queries_do_not_grow_with_orders(self):
+        self.place_orders(1)
+        few, _ = self.count_list_queries()
+        self.place_orders(5)
+        many, data = self.count_list_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(data['results'][0]['items'][0]['product_details']['category_name'], 'Category 5')
+
+    def test_summary_drops_nested_items(self):
+        self.place_orders(3)
+        queries, data = self.count_list_queries(fields='summary')
+        self.assertEqual(queries, 2)
+        self.assertEqual(data['results'][0]['item_count'], 1)
+        self.assertNotIn('items', data['results'][0])
 
-# Create your tests here.
+    def test_fields_skip_the_items_prefetch(self):
+        self.place_orders(2)
+        queries, data = self.count_list_queries(fields='id,status')
+        self.assertEqual(queries, 2)
+        self.assertEqual(list(data['results'][0]), ['id', 'status'])
@@ -1,13 +1,18 @@
-from rest_framework import viewsets, generics, permissions, status
+from rest_framework import viewsets, generics, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import Prefetch
+from django.db.models import Count, Prefetch
 from .models import Cart, CartItem, Order, OrderItem
 from products.models import Product
+from .services import StockReservationError
+from .cart_storage import get_cart_storage
+from ecommerce_project.pagination import CursorPaginationMixin
+from ecommerce_project.sparse_fields import SparseFieldsetViewMixin
+from users.authentication import StatelessJWTAuthentication
 from .serializers import (
-    CartSerializer, CartItemSerializer, OrderSerializer, 
+    CartSerializer, CartItemSerializer, OrderSerializer, OrderSummarySerializer,
     CreateOrderSerializer, OrderStatusUpdateSerializer
 )
 
@@ -15,108 +20,110 @@ class CartItemViewSet(viewsets.ModelViewSet):
     """ViewSet for managing cart items"""
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
     
     def get_queryset(self):
         """Return items for current user's cart"""
         user = self.request.user
         return CartItem.objects.filter(cart__user=user).select_related('product', 'product__category')
     
-    def get_serializer_context(self):
-        """Add cart to serializer context"""
-        context = super().get_serializer_context()
-        user = self.request.user
-        cart, created = Cart.objects.get_or_create(user=user)
-        context['cart'] = cart
-        return context
+    def initial(self, request, *args, **kwargs):
+        """Bring write-behind cart changes into the database before row-level actions"""
+        super().initial(request, *args, **kwargs)
+        if self.action != 'create':
+            get_cart_storage().materialize(request.user)
     
     def create(self, request, *args, **kwargs):
-        """Add item to cart or update quantity if it exists"""
-        user = request.user
-        cart, created = Cart.objects.get_or_create(user=user)
-        
-        product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))
+        """Add item to cart or increase its quantity if it is already there"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data['product']
+        quantity = serializer.validated_data.get('quantity', 1)
         
-        try:
-            # Try to get existing cart item
-            if CartItem.objects.get(cart=cart, product_id=product_id):
-              cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-            print("cart_item:",cart_item)
-            # Update quantity
-            cart_item.quantity += quantity
-            serializer = self.get_serializer(cart_item, data={
-                'product_id': product_id,
-                'quantity': cart_item.quantity
-            }, partial=True)
-            
-        except CartItem.DoesNotExist:
-            # Create new cart item
-            serializer = self.get_serializer(data={
-                'product_id': product_id,
-                'quantity': quantity
-            })
+        storage = get_cart_storage()
+        in_cart = storage.get_quantity(request.user, product.pk)
+        if product.stock < in_cart + quantity:
+            raise serializers.ValidationError(f"Not enough stock available. Only {product.stock} remaining.")
         
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        cart_item = storage.add_item(request.user, product, quantity)
+        data = self.get_serializer(cart_item).data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
     
-    def perform_create(self, serializer):
-        """Save cart item with cart from context"""
-        user = self.request.user
-        cart, created = Cart.objects.get_or_create(user=user)
-        serializer.save(cart=cart)
+    def perform_update(self, serializer):
+        serializer.save()
+        get_cart_storage().invalidate(self.request.user)
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        get_cart_storage().invalidate(self.request.user)
 
 
-class CartView(viewsets.ModelViewSet):  # Use ModelViewSet for default actions
+class CartView(SparseFieldsetViewMixin, viewsets.ModelViewSet):  # Use ModelViewSet for default actions
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
     
     def get_queryset(self):
         """Override this to filter carts by user"""
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product', 'product__category'))
+        )
     
     def retrieve(self, request, *args, **kwargs):
         """Get cart for the current user"""
+        get_cart_storage().materialize(request.user)
         cart = self.get_object()  # This will get the cart for the current user
-        serializer = CartSerializer(cart)
+        serializer = self.get_serializer(cart)
         return Response(serializer.data)
     
     @action(detail=False, methods=['delete'])
     def clear(self, request):
         """Clear all items from cart"""
-        user = request.user
-        try:
-            cart = Cart.objects.get(user=user)
-            cart.items.all().delete()
-            return Response({"message": "Cart cleared successfully"}, status=status.HTTP_204_NO_CONTENT)
-        except Cart.DoesNotExist:
-            return Response({"message": "Cart is already empty"}, status=status.HTTP_204_NO_CONTENT)
+        get_cart_storage().clear(request.user)
+        return Response({"message": "Cart cleared successfully"}, status=status.HTTP_204_NO_CONTENT)
         
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsetViewMixin, CursorPaginationMixin, viewsets.ModelViewSet):
     """ViewSet for managing orders"""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
     
     def get_queryset(self):
         """Return orders for current user"""
         user = self.request.user
-        if user.is_staff:
-            return Order.objects.all().prefetch_related(
-                Prefetch('items', queryset=OrderItem.objects.select_related('product'))
-            )
-        return Order.objects.filter(user=user).prefetch_related(
-            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        queryset = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        if self.wants_summary():
+            # Meta.ordering is not applied to GROUP BY queries
+            return queryset.annotate(item_count=Count('items')).order_by(*Order._meta.ordering)
+        # Everything the nested item/product payload reads, in constant queries
+        return queryset.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product', 'product__category'))
         )
     
+    def wants_summary(self):
+        """Compact representation requested with ?fields=summary"""
+        return self.request.query_params.get('fields') == 'summary'
+    
     def get_serializer_class(self):
         """Return appropriate serializer class based on action"""
         if self.action == 'create':
             return CreateOrderSerializer
         elif self.action == 'update_status' and self.request.user.is_staff:
             return OrderStatusUpdateSerializer
+        elif self.action in ('list', 'retrieve') and self.wants_summary():
+            return OrderSummarySerializer
         return OrderSerializer
     
+    def create(self, request, *args, **kwargs):
+        """Place an order, listing the lines that stock could not cover"""
+        try:
+            return super().create(request, *args, **kwargs)
+        except StockReservationError as exc:
+            return Response({'detail': str(exc), 'items': exc.failures}, status=status.HTTP_400_BAD_REQUEST)
+    
     def perform_create(self, serializer):
         """Create order for current user"""
         serializer.save(user=self.request.user)
@@ -1,6 +1,42 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        if getattr(settings, 'CATALOG_WARM_ON_STARTUP', False):
+            from django.core.signals import request_started
+            # Warm on the first request rather than here: ready() also runs for
+            # migrations and other management commands.
+            request_started.connect(warm_on_first_request, dispatch_uid='products.warm_on_first_request')
+
+
+def warm_on_first_request(sender, **kwargs):
+    """Warm the catalog cache in the background once per process"""
+    from django.core.signals import request_started
+    from .warmup import warm_catalog
+
+    if not request_started.disconnect(dispatch_uid='products.warm_on_first_request'):
+        # Another thread got here first
+        return
+    options = dict(getattr(settings, 'CATALOG_WARM_OPTIONS', {}))
+    if not options.get('host'):
+        options['host'] = _request_host(kwargs)
+        if not options['host']:
+            return
+    threading.Thread(target=warm_catalog, kwargs=options, name='catalog-warmup', daemon=True).start()
+
+
+def _request_host(signal_kwargs):
+    """Host header of the request that sent request_started (WSGI or ASGI)"""
+    if 'environ' in signal_kwargs:
+        return signal_kwargs['environ'].get('HTTP_HOST')
+    for name, value in signal_kwargs.get('scope', {}).get('headers', ()):
+        if name == b'host':
+            return value.decode('latin-1')
+    return None
@@ -0,0 +1,249 @@
+import math
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Namespaces for the catalog generation counters. Product payloads embed the
+# category name, so a category write bumps both namespaces.
+CATEGORY_NAMESPACE = 'category'
+PRODUCT_NAMESPACE = 'product'
+
+
+def _generation_key(namespace):
+    return f'catalog_generation_{namespace}'
+
+
+def get_generation(namespace):
+    """Return the current generation counter for a catalog namespace"""
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        # Counter missing (flushed or evicted): seed it from the clock so the
+        # new generation never collides with keys written under an old one.
+        cache.add(key, _fresh_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _fresh_generation():
+    return time.time_ns() // 1000
+
+
+def _modified_key(namespace):
+    return f'catalog_modified_{namespace}'
+
+
+def get_last_modified(namespace):
+    """Return the time (epoch seconds) of the last write to a catalog namespace"""
+    key = _modified_key(namespace)
+    modified = cache.get(key)
+    if modified is None:
+        # Lost along with the counter: treat the catalog as just modified
+        cache.add(key, int(time.time()), None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_generation(*namespaces):
+    """Invalidate every cached key of the given namespaces in O(1)"""
+    for namespace in namespaces:
+        key = _generation_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Counter missing: readers will see a fresh generation anyway
+            if not cache.add(key, _fresh_generation(), None):
+                cache.incr(key)
+        cache.set(_modified_key(namespace), int(time.time()), None)
+
+
+def bump_category_generation():
+    """Invalidate cached category and product payloads"""
+    bump_generation(CATEGORY_NAMESPACE, PRODUCT_NAMESPACE)
+
+
+def bump_product_generation():
+    """Invalidate cached product payloads"""
+    bump_generation(PRODUCT_NAMESPACE)
+
+
+def catalog_key(namespace, *parts):
+    """Build a cache key tied to the current generation of a namespace"""
+    suffix = ':'.join(str(part) for part in parts)
+    return f'{namespace}:g{get_generation(namespace)}:{suffix}'
+
+
+def _slug_key(namespace, slug):
+    return f'catalog_slug_{namespace}_{slug}'
+
+
+def get_slug_id(namespace, slug):
+    """Return the id the slug was last seen pointing to, or None"""
+    return cache.get(_slug_key(namespace, slug))
+
+
+def remember_slug(namespace, slug, pk):
+    """Map ``slug`` to ``pk`` so detail reads can build cache keys without a query.
+
+    The mapping is deliberately not tied to the generation: it only changes
+    when an object is renamed or deleted, and a stale entry only costs the
+    database lookup it was meant to save.
+    """
+    cache.set(_slug_key(namespace, slug), pk, None)
+
+
+def forget_slug(namespace, slug):
+    cache.delete(_slug_key(namespace, slug))
+
+
+def _stats_key(name, outcome):
+    return f'catalog_stats_{name}_{outcome}'
+
+
+def record_cache_access(name, hit):
+    """Count a hit or miss for a cached catalog endpoint"""
+    key = _stats_key(name, 'hits' if hit else 'misses')
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_cache_stats(name):
+    """Return the hit/miss counters recorded for a cached catalog endpoint"""
+    hits = cache.get(_stats_key(name, 'hits'), 0)
+    misses = cache.get(_stats_key(name, 'misses'), 0)
+    return {'hits': hits, 'misses': misses}
+
+
+def reset_cache_stats(name):
+    cache.delete_many([_stats_key(name, 'hits'), _stats_key(name, 'misses')])
+
+
+# Cache fill protection (see get_or_fill)
+FILL_LOCK_TIMEOUT = getattr(settings, 'CATALOG_FILL_LOCK_TIMEOUT', 10)
+FILL_WAIT_INTERVAL = 0.05
+STALE_TTL = getattr(settings, 'CATALOG_STALE_TTL', 60 * 60)
+EARLY_REFRESH_BETA = getattr(settings, 'CATALOG_EARLY_REFRESH_BETA', 1.0)
+
+# Stored value plus what early refresh needs: when it goes soft-stale and
+# how long it took to compute (seconds)
+CacheEntry = namedtuple('CacheEntry', ['value', 'expires_at', 'delta'])
+
+# Per-process single flight: threads filling keys on the same stripe queue up
+_fill_locks = [threading.Lock() for _ in range(64)]
+
+# Fills performed by this process, for reporting (see get_fill_count)
+_fill_count = 0
+_fill_count_lock = threading.Lock()
+
+
+def get_fill_count():
+    """Return how many cache entries get_or_fill() has computed in this process"""
+    return _fill_count
+
+
+def _stale_key(namespace, parts):
+    suffix = ':'.join(str(part) for part in parts)
+    return f'{namespace}:stale:{suffix}'
+
+
+def _should_refresh(entry, now):
+    """Probabilistic early expiration ("XFetch"): refresh sooner for slow fills"""
+    if EARLY_REFRESH_BETA <= 0:
+        return now >= entry.expires_at
+    return now - entry.delta * EARLY_REFRESH_BETA * math.log(1.0 - random.random()) >= entry.expires_at
+
+
+def _acquire_fill_lock(key):
+    token = uuid.uuid4().hex
+    if cache.add(f'{key}:lock', token, FILL_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release_fill_lock(key, token):
+    lock_key = f'{key}:lock'
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _fill(key, stale_key, fill, timeout):
+    global _fill_count
+    start = time.monotonic()
+    value = fill()
+    entry = CacheEntry(value, time.time() + timeout, time.monotonic() - start)
+    cache.set(key, entry, timeout)
+    # The stale copy outlives generation bumps so it can cover refills
+    cache.set(stale_key, entry, timeout + STALE_TTL)
+    with _fill_count_lock:
+        _fill_count += 1
+    return value
+
+
+def get_or_fill(namespace, parts, fill, timeout, stats_name=None, on_stale=None):
+    """Return the cached catalog value for ``parts``, computing it with ``fill()`` on a miss.
+
+    Protects the database from a thundering herd when a hot key expires or
+    its namespace generation is bumped:
+
+    * single flight: one thread per process and one process per cache (a
+      ``cache.add`` lock) runs ``fill``; the others wait for its result;
+    * stale-while-revalidate: while a refill is in flight, callers get the
+      previous value (kept under a generation-less key) instead of waiting,
+      and ``on_stale()`` is called so they can tell their clients;
+    * probabilistic early refresh: shortly before expiry one caller refills
+      the key while everybody else keeps reading the current value.
+    """
+    key = catalog_key(namespace, *parts)
+    stale_key = _stale_key(namespace, parts)
+
+    entry = cache.get(key)
+    if isinstance(entry, CacheEntry):
+        if stats_name:
+            record_cache_access(stats_name, hit=True)
+        if _should_refresh(entry, time.time()):
+            token = _acquire_fill_lock(key)
+            if token is not None:
+                try:
+                    return _fill(key, stale_key, fill, timeout)
+                finally:
+                    _release_fill_lock(key, token)
+        return entry.value
+
+    if stats_name:
+        record_cache_access(stats_name, hit=False)
+    with _fill_locks[hash(key) % len(_fill_locks)]:
+        entry = cache.get(key)
+        if isinstance(entry, CacheEntry):
+            # Filled by another thread of this process while we queued
+            return entry.value
+
+        token = _acquire_fill_lock(key)
+        if token is not None:
+            try:
+                return _fill(key, stale_key, fill, timeout)
+            finally:
+                _release_fill_lock(key, token)
+
+    # Another process is filling the key. The stripe is released first so
+    # threads waiting on unrelated keys that share it are not held up.
+    stale = cache.get(stale_key)
+    if isinstance(stale, CacheEntry):
+        if on_stale is not None:
+            on_stale()
+        return stale.value
+    deadline = time.monotonic() + FILL_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(FILL_WAIT_INTERVAL)
+        entry = cache.get(key)
+        if isinstance(entry, CacheEntry):
+            return entry.value
+    # The filler died or is too slow: fill without the lock
+    return _fill(key, stale_key, fill, timeout)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import django_filters
+from rest_framework import filters
 from .models import Product
+from .search import get_search_backend
 
 class ProductFilter(django_filters.FilterSet):
     """Filter class for Product model"""
@@ -15,4 +17,29 @@ class ProductFilter(django_filters.FilterSet):
     def filter_in_stock(self, queryset, name, value):
         if value:
             return queryset.filter(stock__gt=0)
-        return queryset.filter(stock=0)
\ No newline at end of file
+        return queryset.filter(stock=0)
+
+class ProductSearchFilter(filters.SearchFilter):
+    """Full-text search through the product search backend.
+    
+    Falls back to DRF's ``icontains`` search over ``search_fields`` when the
+    database has no full-text index.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        
+        backend = get_search_backend(queryset.model)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        return backend.search(queryset, ' '.join(terms))
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """Order search results by relevance unless the client asks otherwise"""
+    
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and 'search_rank' in queryset.query.annotations:
+            return ['search_rank']
+        return super().get_ordering(request, queryset, view)
\ No newline at end of file
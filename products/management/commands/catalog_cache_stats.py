@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Report the hit/miss counters of the cached catalog endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', default=['product_list'],
+                            help='Counters to report (default: product_list)')
+        parser.add_argument('--reset', action='store_true', help='Clear the counters afterwards')
+
+    def handle(self, *args, **options):
+        for name in options['names']:
+            stats = get_cache_stats(name)
+            total = stats['hits'] + stats['misses']
+            rate = f"{stats['hits'] / total:.1%}" if total else 'n/a'
+            self.stdout.write(f"{name}: {stats['hits']} hits, {stats['misses']} misses ({rate} hit rate)")
+            if options['reset']:
+                reset_cache_stats(name)
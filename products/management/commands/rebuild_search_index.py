@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from the catalog tables'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('Full-text search is not available on this database.')
+        with transaction.atomic(using=backend.alias):
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {backend.table}.'))
@@ -0,0 +1,31 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from products.warmup import warm_catalog
+
+
+class Command(BaseCommand):
+    help = ('Precompute the catalog cache: category list and pages, the first product listing pages '
+            'of every category and the best-selling product pages')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-products', type=int, default=100,
+                            help='Number of best-selling product pages to warm')
+        parser.add_argument('--pages', type=int, default=1, help='Listing pages to warm per category')
+        parser.add_argument('--workers', type=int, default=8, help='Parallel requests')
+        parser.add_argument('--host',
+                            help="Host header clients use; it is part of the cache keys "
+                                 "(default: CATALOG_WARM_OPTIONS['host'])")
+
+    def handle(self, *args, **options):
+        try:
+            summary = warm_catalog(
+                top_products=options['top_products'], pages=options['pages'],
+                workers=options['workers'], host=options['host'],
+            )
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {summary['keys_written']} keys with {summary['requests']} requests "
+            f"in {summary['seconds']}s ({summary['failed']} failed)."
+        ))
@@ -1,8 +1,97 @@
 from django.db import models
-from django.core.cache import cache
 from django.utils.text import slugify
+from .cache import (
+    CATEGORY_NAMESPACE, PRODUCT_NAMESPACE, bump_category_generation, bump_product_generation, forget_slug,
+    remember_slug,
+)
+from .search import get_search_backend
+from tasks.queue import enqueue
 
-class Category(models.Model):
+
+class CatalogQuerySet(models.QuerySet):
+    """QuerySet that invalidates the catalog cache on bulk writes"""
+    # Generation bump to run after a bulk write; set per model below
+    bump_generation = None
+
+    def update(self, **kwargs):
+        # Renames skip save(), so drop the old slug mappings here
+        old_slugs = list(self.values_list('slug', flat=True)) if 'slug' in kwargs else []
+        rows = super().update(**kwargs)
+        for slug in old_slugs:
+            forget_slug(self.model.slug_namespace, slug)
+        if rows:
+            self.bump_generation()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            self.bump_generation()
+        return result
+
+    delete.alters_data = True
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        if objs:
+            self.bump_generation()
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        if rows:
+            self.bump_generation()
+        return rows
+
+
+class SlugMappedModel(models.Model):
+    """Keeps the slug -> id cache mapping of a catalog model up to date"""
+    slug_namespace = None
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The slug as stored, to drop its mapping if the object is renamed
+        instance._loaded_slug = instance.__dict__.get('slug')
+        return instance
+    
+    def update_slug_mapping(self):
+        loaded_slug = getattr(self, '_loaded_slug', None)
+        if loaded_slug and loaded_slug != self.slug:
+            forget_slug(self.slug_namespace, loaded_slug)
+        remember_slug(self.slug_namespace, self.slug, self.pk)
+        self._loaded_slug = self.slug
+    
+    def forget_slug_mapping(self):
+        forget_slug(self.slug_namespace, getattr(self, '_loaded_slug', None) or self.slug)
+
+
+class CategoryQuerySet(CatalogQuerySet):
+    bump_generation = staticmethod(bump_category_generation)
+
+
+class ProductQuerySet(CatalogQuerySet):
+    bump_generation = staticmethod(bump_product_generation)
+
+    def update_stock(self, stock):
+        """Write stock levels without invalidating the catalog cache.
+
+        Checkouts change stock on every order; bumping the product generation
+        each time would drop every cached listing and detail page under load.
+        Cached payloads show stock as of their fill (at most ``CACHE_TTL``
+        old); checkouts still check the real stock.
+        """
+        return models.QuerySet.update(self, stock=stock)
+
+    update_stock.alters_data = True
+
+
+class Category(SlugMappedModel):
     """Category model for products"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -10,6 +99,9 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CategoryQuerySet.as_manager()
+    slug_namespace = CATEGORY_NAMESPACE
+    
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['name']
@@ -21,20 +113,27 @@ class Category(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
         
-        # Invalidate category cache when saving
-        cache.delete('category_list')
-        cache.delete(f'category_{self.id}')
-        
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        
+        # Product search documents include the category name; re-indexing
+        # every product is left to the task worker
+        if not adding and get_search_backend(Product) is not None:
+            enqueue('products.reindex_category', {'category_id': self.pk})
+        
+        # Invalidate category (and product) cache after saving
+        self.update_slug_mapping()
+        bump_category_generation()
     
     def delete(self, *args, **kwargs):
-        # Invalidate category cache when deleting
-        cache.delete('category_list')
-        cache.delete(f'category_{self.id}')
+        self.forget_slug_mapping()
+        result = super().delete(*args, **kwargs)
         
-        super().delete(*args, **kwargs)
+        # Invalidate category (and product) cache after deleting
+        bump_category_generation()
+        return result
 
-class Product(models.Model):
+class Product(SlugMappedModel):
     """Product model for the e-commerce store"""
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -46,8 +145,25 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    slug_namespace = PRODUCT_NAMESPACE
+    
     class Meta:
         ordering = ['name']
+        indexes = [
+            # ProductFilter: ?category=...&min_price=...&max_price=...
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            # OrderingFilter targets, with the id tie-breaker used by keyset pagination
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            # ?in_stock=true listings only ever touch rows with stock
+            models.Index(
+                fields=['category', 'name'],
+                condition=models.Q(stock__gt=0),
+                name='product_in_stock_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.name
@@ -56,17 +172,26 @@ class Product(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
         
-        # Invalidate product cache when saving
-        cache.delete('product_list')
-        cache.delete(f'product_{self.id}')
-        cache.delete(f'products_category_{self.category_id}')
-        
         super().save(*args, **kwargs)
+        
+        # Keep the full-text search index in sync
+        backend = get_search_backend(Product)
+        if backend is not None:
+            backend.index_products([self])
+        
+        # Invalidate product cache after saving
+        self.update_slug_mapping()
+        bump_product_generation()
     
     def delete(self, *args, **kwargs):
-        # Invalidate product cache when deleting
-        cache.delete('product_list')
-        cache.delete(f'product_{self.id}')
-        cache.delete(f'products_category_{self.category_id}')
+        product_id = self.pk
+        self.forget_slug_mapping()
+        result = super().delete(*args, **kwargs)
+        
+        backend = get_search_backend(Product)
+        if backend is not None:
+            backend.remove_products([product_id])
         
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        # Invalidate product cache after deleting
+        bump_product_generation()
+        return result
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""Full-text product search.
+
+Products are mirrored into an inverted index that lives next to the
+catalog tables: an FTS5 virtual table on SQLite and a ``tsvector`` column
+with a GIN index on PostgreSQL (both created by migration
+``0003_product_search_index``). ``Product.save()``/``delete()`` keep the
+index in sync, category renames are re-indexed by the task worker
+(``products.reindex_category``); bulk writes can be caught up with
+``manage.py rebuild_search_index``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+TERM_RE = re.compile(r'\w+')
+
+
+def parse_terms(query):
+    """Split a search string into lower-cased word terms"""
+    return TERM_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """Interface for product search backends"""
+    table = None
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def connection(self):
+        return connections[self.alias]
+
+    def index_products(self, products):
+        """Add or refresh the index entries of ``products``"""
+        raise NotImplementedError
+
+    def remove_products(self, product_ids):
+        """Drop the index entries of the given product ids"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Re-index the whole catalog"""
+        raise NotImplementedError
+
+    def match_sql(self, terms):
+        """Return ``(sql, params)`` selecting the ids of products matching every term (as a prefix)"""
+        raise NotImplementedError
+
+    def rank_sql(self, terms, product_column):
+        """Return ``(sql, params)`` ranking the product in ``product_column``; lower is better"""
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        """Restrict ``queryset`` to matches of ``query``, annotated with ``search_rank``.
+
+        Matching is a subquery on the index, so the view's other filters,
+        pagination and count apply to every match rather than to a top-N.
+        """
+        terms = parse_terms(query)
+        if not terms:
+            return queryset
+        quote = self.connection().ops.quote_name
+        meta = queryset.model._meta
+        product_column = f'{quote(meta.db_table)}.{quote(meta.pk.column)}'
+        return queryset.filter(pk__in=RawSQL(*self.match_sql(terms))).annotate(
+            search_rank=RawSQL(*self.rank_sql(terms, product_column), output_field=FloatField())
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 index ranked with bm25, name weighted over category over description"""
+    table = 'products_product_fts'
+
+    def index_products(self, products):
+        rows = [(product.pk, product.name, product.description, product.category.name) for product in products]
+        if not rows:
+            return
+        with self.connection().cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description, category) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        with self.connection().cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def rebuild(self):
+        with self.connection().cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description, category) '
+                'SELECT p.id, p.name, p.description, c.name '
+                'FROM products_product p JOIN products_category c ON c.id = p.category_id'
+            )
+
+    def expression(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def match_sql(self, terms):
+        return f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [self.expression(terms)]
+
+    def rank_sql(self, terms, product_column):
+        # bm25() is negative, best matches lowest; the rowid constraint is a seek
+        return (
+            f'SELECT bm25({self.table}, 10.0, 1.0, 5.0) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {product_column}',
+            [self.expression(terms)],
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """tsvector/GIN index ranked with ts_rank_cd, name weighted over category over description"""
+    table = 'products_product_search'
+    document_sql = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'C')"
+    )
+
+    def index_products(self, products):
+        rows = [(product.pk, product.name, product.category.name, product.description) for product in products]
+        if not rows:
+            return
+        with self.connection().cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (product_id, document) VALUES (%s, {self.document_sql}) '
+                'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        # Rows also go away with the product through ON DELETE CASCADE
+        with self.connection().cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def rebuild(self):
+        with self.connection().cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (product_id, document) '
+                "SELECT p.id, setweight(to_tsvector('simple', p.name), 'A') || "
+                "setweight(to_tsvector('simple', c.name), 'B') || "
+                "setweight(to_tsvector('simple', p.description), 'C') "
+                'FROM products_product p JOIN products_category c ON c.id = p.category_id'
+            )
+
+    def expression(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def match_sql(self, terms):
+        return (
+            f"SELECT product_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)",
+            [self.expression(terms)],
+        )
+
+    def rank_sql(self, terms, product_column):
+        # Negated so that, as with bm25, the best match sorts first
+        return (
+            f"SELECT -ts_rank_cd(document, to_tsquery('simple', %s)) FROM {self.table} "
+            f'WHERE product_id = {product_column}',
+            [self.expression(terms)],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_available = {}
+
+
+def get_search_backend(model=None):
+    """Return the search backend for the products database, or None.
+
+    ``None`` means full-text search is unavailable (disabled through
+    ``PRODUCT_SEARCH_BACKEND = 'none'``, an unsupported database, or SQLite
+    built without FTS5) and callers should fall back to ``icontains``.
+    """
+    if getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto') == 'none':
+        return None
+    if model is None:
+        from .models import Product
+        model = Product
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    backend_class = BACKENDS.get(connection.vendor)
+    if backend_class is None:
+        return None
+
+    # The index table is created by migration only where the database
+    # supports it; remember the answer per database.
+    availability_key = (alias, str(connection.settings_dict['NAME']))
+    if availability_key not in _available:
+        with connection.cursor() as cursor:
+            _available[availability_key] = backend_class.table in connection.introspection.table_names(cursor)
+    if not _available[availability_key]:
+        return None
+    return backend_class(alias)
@@ -1,14 +1,15 @@
 from rest_framework import serializers
+from ecommerce_project.sparse_fields import SparseFieldsetSerializerMixin
 from .models import Category, Product
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for the Category model"""
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'slug', 'created_at', 'updated_at']
         read_only_fields = ['slug', 'created_at', 'updated_at']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for the Product model"""
     category_name = serializers.ReadOnlyField(source='category.name')
     
@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from tasks.queue import task
+from .cache import bump_product_generation
+from .models import Product
+from .search import get_search_backend
+from .warmup import warm_catalog
+
+
+@task('products.reindex_category')
+def reindex_category(category_id):
+    """Refresh the search documents of a category's products (they embed its name)"""
+    backend = get_search_backend(Product)
+    if backend is not None:
+        backend.index_products(Product.objects.filter(category_id=category_id).select_related('category'))
+
+
+@task('products.refresh_catalog')
+def refresh_catalog():
+    """Publish stock changed by checkouts and re-warm the hot catalog reads"""
+    # reserve_stock() writes stock through update_stock(), which leaves the
+    # cache alone: this is the only invalidation checkouts cause
+    bump_product_generation()
+    options = getattr(settings, 'CATALOG_WARM_OPTIONS', {})
+    # Without a configured host there is no way to tell which keys clients read
+    if options.get('host'):
+        warm_catalog(**options)
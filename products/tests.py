@@ -1,3 +1,463 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.signals import request_started
+from django.db import connection
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ecommerce_project.cache import LocalTier, TwoTierCache
+from ecommerce_project.pagination import KeysetPagination
+from ecommerce_project.values_serializers import ValuesSerializer
+from tasks.queue import run_pending
+from .apps import warm_on_first_request
+from .cache import (
+    CATEGORY_NAMESPACE, PRODUCT_NAMESPACE, bump_product_generation, catalog_key, get_cache_stats, get_generation,
+    get_or_fill, remember_slug,
+)
+from .models import Category, Product
+from .search import get_search_backend
+from .serializers import CategorySerializer, ProductSerializer
+
+
+class CatalogGenerationTests(TestCase):
+    """Catalog cache keys are invalidated by every kind of write"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            name='Novel', description='A novel', price=Decimal('9.99'),
+            stock=5, category=self.category,
+        )
+
+    def test_save_bumps_product_generation(self):
+        before = get_generation(PRODUCT_NAMESPACE)
+        self.product.save()
+        self.assertNotEqual(get_generation(PRODUCT_NAMESPACE), before)
+
+    def test_queryset_update_bumps_product_generation(self):
+        before = get_generation(PRODUCT_NAMESPACE)
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        self.assertNotEqual(get_generation(PRODUCT_NAMESPACE), before)
+
+    def test_stock_update_keeps_the_cache(self):
+        before = get_generation(PRODUCT_NAMESPACE)
+        self.assertEqual(Product.objects.filter(pk=self.product.pk).update_stock(1), 1)
+        self.assertEqual(get_generation(PRODUCT_NAMESPACE), before)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_category_write_bumps_both_namespaces(self):
+        category_before = get_generation(CATEGORY_NAMESPACE)
+        product_before = get_generation(PRODUCT_NAMESPACE)
+        Category.objects.filter(pk=self.category.pk).update(name='Fiction')
+        self.assertNotEqual(get_generation(CATEGORY_NAMESPACE), category_before)
+        self.assertNotEqual(get_generation(PRODUCT_NAMESPACE), product_before)
+
+
+class ProductListCacheTests(TestCase):
+    """Filtered and paginated product listings are served from the cache"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Games')
+        for index in range(3):
+            Product.objects.create(
+                name=f'Game {index}', description='Board game', price=Decimal('20.00'),
+                stock=index, category=category,
+            )
+
+    def test_equivalent_queries_share_a_cache_entry(self):
+        first = self.client.get('/api/products/', {'min_price': '10', 'in_stock': 'true', 'page': '1'})
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products/?in_stock=True&min_price=10.00')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(get_cache_stats('product_list'), {'hits': 1, 'misses': 1})
+        output = StringIO()
+        call_command('catalog_cache_stats', '--reset', stdout=output)
+        self.assertEqual(output.getvalue(), 'product_list: 1 hits, 1 misses (50.0% hit rate)\n')
+        self.assertEqual(get_cache_stats('product_list'), {'hits': 0, 'misses': 0})
+
+    @mock.patch('rest_framework.pagination.PageNumberPagination.page_size', 1)
+    def test_shared_entry_links_follow_each_request(self):
+        self.client.get('/api/products/', {'min_price': '10', 'page': '2', 'utm_source': 'mail'})
+        with self.assertNumQueries(0):
+            data = self.client.get('/api/products/?page=2&min_price=10.00').json()
+        # Nothing of the first requester's query string leaks into the links
+        self.assertEqual(data['next'], 'http://testserver/api/products/?min_price=10.00&page=3')
+        self.assertEqual(data['previous'], 'http://testserver/api/products/?min_price=10.00')
+
+    def test_product_write_invalidates_listing(self):
+        self.client.get('/api/products/')
+        Product.objects.filter(stock=0).update(stock=7)
+        response = self.client.get('/api/products/', {'in_stock': 'false'})
+        self.assertEqual(response.json()['count'], 0)
+
+
+@mock.patch.object(KeysetPagination, 'page_size', 2)
+class KeysetPaginationTests(TestCase):
+    """Cursor pagination walks the catalog without gaps or duplicates"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Toys')
+        # Duplicate prices exercise the id tie-breaker
+        for index, price in enumerate(['5.00', '5.00', '5.00', '7.50', '1.00']):
+            Product.objects.create(
+                name=f'Toy {index}', description='Toy', price=Decimal(price),
+                stock=1, category=category,
+            )
+
+    def walk(self, url):
+        slugs, pages = [], []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            slugs += [product['slug'] for product in data['results']]
+            pages.append(data)
+            url = data['next']
+        return slugs, pages
+
+    def test_pages_follow_ordering_filter(self):
+        slugs, pages = self.walk('/api/products/?pagination=cursor&ordering=-price')
+        expected = list(Product.objects.order_by('-price', '-id').values_list('slug', flat=True))
+        self.assertEqual(slugs, expected)
+        self.assertEqual(len(pages), 3)
+
+        previous = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_tampered_cursors_are_not_found(self):
+        def cursor(position):
+            return base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+
+        for url, position in [
+            ('/api/products/?pagination=cursor', ['x', 'abc']),
+            ('/api/products/?pagination=cursor', [None, None]),
+            ('/api/products/?pagination=cursor', [['Toy'], {}]),
+            ('/api/products/?pagination=cursor&ordering=created_at', ['2020-13-45', 1]),
+            ('/api/products/?pagination=cursor&ordering=-price', ['cheap', 1]),
+        ]:
+            with self.subTest(position=position):
+                response = self.client.get(f'{url}&cursor={cursor(position)}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_count_is_opt_in(self):
+        data = self.client.get('/api/products/?pagination=cursor&count=true').json()
+        self.assertEqual(data['count'], 5)
+
+
+class ProductSearchTests(TestCase):
+    """Full-text search with prefix matching and relevance ranking"""
+
+    def setUp(self):
+        cache.clear()
+        self.kitchen = Category.objects.create(name='Kitchen')
+        Product.objects.create(name='Kettle', description='Boils water fast', price=Decimal('30.00'),
+                               stock=3, category=self.kitchen)
+        Product.objects.create(name='Teapot', description='Pairs well with a kettle', price=Decimal('15.00'),
+                               stock=3, category=self.kitchen)
+        Product.objects.create(name='Toaster', description='Two slots', price=Decimal('25.00'),
+                               stock=3, category=self.kitchen)
+
+    def search(self, term, **params):
+        response = self.client.get('/api/products/', {'search': term, **params})
+        return [product['name'] for product in response.json()['results']]
+
+    def test_prefix_match_ranks_name_over_description(self):
+        self.assertEqual(self.search('ket'), ['Kettle', 'Teapot'])
+
+    def test_explicit_ordering_overrides_rank(self):
+        self.assertEqual(self.search('kettle', ordering='price'), ['Teapot', 'Kettle'])
+
+    def test_filters_and_count_cover_every_match(self):
+        garden = Category.objects.create(name='Garden')
+        Product.objects.bulk_create([
+            Product(name=f'Watering can {index}', slug=f'watering-can-{index}', description='Holds water',
+                    price=Decimal('5.00'), stock=1, category=self.kitchen if index % 2 else garden)
+            for index in range(1500)
+        ])
+        get_search_backend().rebuild()
+        self.assertEqual(self.client.get('/api/products/', {'search': 'water'}).json()['count'], 1501)
+        response = self.client.get('/api/products/', {'search': 'watering', 'category': 'garden', 'page': 75})
+        self.assertEqual(response.json()['count'], 750)
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_index_follows_renames(self):
+        self.kitchen.name = 'Appliances'
+        self.kitchen.save()
+        # Product documents are refreshed by the task worker
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(len(self.search('applian')), 3)
+        self.assertEqual(self.search('kitchen'), [])
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?exclude= narrow both the payload and the SELECT"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Tools')
+        Product.objects.create(name='Saw', description='A very long description', price=Decimal('12.00'),
+                               stock=2, category=category)
+
+    def test_fields_narrow_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/products/', {'fields': 'id,name,price'})
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'name', 'price'])
+        sql = ' '.join(query['sql'] for query in context)
+        self.assertNotIn('description', sql)
+        self.assertNotIn('products_category', sql)
+
+    def test_exclude_keeps_related_name(self):
+        product = self.client.get('/api/products/', {'exclude': 'description,image'}).json()['results'][0]
+        self.assertNotIn('description', product)
+        self.assertEqual(product['category_name'], 'Tools')
+
+    def test_projections_are_cached_separately(self):
+        self.client.get('/api/products/', {'fields': 'id'})
+        full = self.client.get('/api/products/').json()['results'][0]
+        self.assertIn('description', full)
+
+
+class ValuesSerializerTests(TestCase):
+    """The values() fast path renders exactly what the DRF serializers do"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Lamps', description='Light')
+        Product.objects.create(name='Desk lamp', description='Bright', price=Decimal('19.5'),
+                               stock=4, category=category, image='products/desk.png')
+        Product.objects.create(name='Floor lamp', description='Tall', price=Decimal('120.00'),
+                               stock=0, category=category)
+
+    def render_both(self, serializer_class, queryset, **params):
+        request = Request(APIRequestFactory().get('/api/products/', params))
+        context = {'request': request}
+        fast = ValuesSerializer.for_serializer(serializer_class(context=context))
+        self.assertIsNotNone(fast)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+        actual = JSONRenderer().render(fast.serialize(fast.project(queryset)))
+        return expected, actual
+
+    def test_product_output_is_byte_identical(self):
+        expected, actual = self.render_both(ProductSerializer, Product.objects.select_related('category'))
+        self.assertEqual(actual, expected)
+        self.assertIn(b'"http://testserver/products/desk.png"', actual)
+
+    def test_sparse_category_output_is_byte_identical(self):
+        expected, actual = self.render_both(CategorySerializer, Category.objects.all(), exclude='description')
+        self.assertEqual(actual, expected)
+
+    def test_listing_builds_no_model_instances(self):
+        with mock.patch.object(Product, 'from_db', side_effect=AssertionError):
+            response = self.client.get('/api/products/', {'ordering': 'price'})
+        self.assertEqual([product['price'] for product in response.json()['results']], ['19.50', '120.00'])
+
+
+class ConditionalRequestTests(TestCase):
+    """Catalog reads answer revalidations with 304 from the cache alone"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Paint')
+        self.product = Product.objects.create(name='Primer', description='White', price=Decimal('8.00'),
+                                              stock=9, category=self.category)
+
+    def test_matching_etag_is_not_modified_without_queries(self):
+        response = self.client.get('/api/products/', {'in_stock': 'true'})
+        self.assertIn('max-age=', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            revalidated = self.client.get('/api/products/', {'in_stock': 'true'},
+                                          HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_write_changes_validators(self):
+        url = f'/api/products/{self.product.slug}/'
+        response = self.client.get(url)
+        self.product.stock = 3
+        self.product.save()
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(revalidated.json()['stock'], 3)
+
+    def test_stale_body_is_sent_without_validators(self):
+        url = f'/api/products/{self.product.slug}/'
+        self.client.get(url)
+        self.product.stock = 3
+        self.product.save()
+        # Another process is refilling the new generation
+        with mock.patch('products.cache._acquire_fill_lock', return_value=None):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['stock'], 9)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_if_modified_since(self):
+        response = self.client.get('/api/products/categories/')
+        revalidated = self.client.get('/api/products/categories/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+
+
+class CacheFillTests(TestCase):
+    """get_or_fill keeps concurrent misses off the database"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def fill(self, value='fresh', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_concurrent_misses_fill_once(self):
+        results = []
+        fill = self.fill(delay=0.2)
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_fill(PRODUCT_NAMESPACE, ['hot'], fill, 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_another_worker_refills(self):
+        get_or_fill(PRODUCT_NAMESPACE, ['hot'], self.fill('old'), 60)
+        bump_product_generation()
+        # Another process holds the fill lock for the new generation
+        cache.add(catalog_key(PRODUCT_NAMESPACE, 'hot') + ':lock', 'other', 60)
+        self.assertEqual(get_or_fill(PRODUCT_NAMESPACE, ['hot'], self.fill('new'), 60), 'old')
+        self.assertEqual(self.calls, 1)
+
+    def test_entries_are_refreshed_before_they_expire(self):
+        # A fill that took 10ms is refreshed up to ~140ms early at this draw
+        get_or_fill(PRODUCT_NAMESPACE, ['hot'], self.fill('old', delay=0.01), 60)
+        with mock.patch('products.cache.time.time', return_value=time.time() + 59.9), \
+                mock.patch('products.cache.random.random', return_value=0.999999):
+            self.assertEqual(get_or_fill(PRODUCT_NAMESPACE, ['hot'], self.fill('new'), 60), 'new')
+        self.assertEqual(self.calls, 2)
+
+
+class TwoTierCacheTests(TestCase):
+    """The local LRU tier stays coherent with writes from other workers"""
+
+    def setUp(self):
+        cache.clear()
+
+    def worker(self, max_entries=100, **options):
+        backend = TwoTierCache('shared', {'OPTIONS': {'SYNC_INTERVAL': 0, **options}})
+        # Each worker process has its own local tier
+        backend.local = LocalTier(max_entries)
+        return backend
+
+    def test_hits_are_served_locally(self):
+        worker = self.worker(SYNC_INTERVAL=60)
+        worker.set('category:list', ['Books'])
+        worker.get('category:list')
+        with mock.patch.object(caches['shared'], 'get', side_effect=AssertionError):
+            self.assertEqual(worker.get('category:list'), ['Books'])
+
+    def test_writes_are_broadcast_to_other_workers(self):
+        first, second = self.worker(), self.worker()
+        first.set('catalog_generation_product', 1)
+        self.assertEqual(second.get('catalog_generation_product'), 1)
+        first.incr('catalog_generation_product')
+        self.assertEqual(second.get('catalog_generation_product'), 2)
+        first.delete('catalog_generation_product')
+        self.assertIsNone(second.get('catalog_generation_product'))
+
+    def test_local_tier_is_bounded(self):
+        worker = self.worker(max_entries=2)
+        for index in range(3):
+            worker.set(f'product:{index}', index)
+        self.assertEqual(len(worker.local.entries), 2)
+        self.assertEqual(worker.get('product:0'), 0)
+
+
+class DetailBySlugTests(TestCase):
+    """Cached detail pages are served by slug without touching the database"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Garden Tools')
+        self.product = Product.objects.create(name='Hoe', description='Sturdy', price=Decimal('14.00'),
+                                              stock=7, category=self.category)
+
+    def test_cache_hit_costs_no_queries(self):
+        self.client.get('/api/products/hoe/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/hoe/')
+        self.assertEqual(response.json()['name'], 'Hoe')
+        self.client.get('/api/products/categories/garden-tools/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/categories/garden-tools/')
+
+    def test_renamed_and_deleted_slugs_404(self):
+        self.client.get('/api/products/hoe/')
+        product = Product.objects.get(pk=self.product.pk)
+        product.slug = 'garden-hoe'
+        product.save()
+        self.assertEqual(self.client.get('/api/products/hoe/').status_code, 404)
+        self.assertEqual(self.client.get('/api/products/garden-hoe/').json()['id'], self.product.pk)
+
+        Product.objects.filter(pk=self.product.pk).delete()
+        self.assertEqual(self.client.get('/api/products/garden-hoe/').status_code, 404)
+
+
+    def test_bulk_rename_404s_the_old_slug(self):
+        self.client.get('/api/products/hoe/')
+        Product.objects.filter(pk=self.product.pk).update(slug='garden-hoe')
+        self.assertEqual(self.client.get('/api/products/garden-hoe/').status_code, 200)
+        self.assertEqual(self.client.get('/api/products/hoe/').status_code, 404)
+
+        # A mapping left behind by a write that skipped the ORM is caught on the hit
+        remember_slug(PRODUCT_NAMESPACE, 'hoe', self.product.pk)
+        self.assertEqual(self.client.get('/api/products/hoe/').status_code, 404)
+
+class WarmCatalogCacheTests(TransactionTestCase):
+    """warm_catalog_cache precomputes what the first visitors would miss"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Bikes')
+        Product.objects.create(name='Road bike', description='Fast', price=Decimal('900.00'),
+                               stock=2, category=category)
+
+    def test_warmed_reads_are_cache_hits(self):
+        output = StringIO()
+        call_command('warm_catalog_cache', '--workers', '2', '--host', 'testserver', stdout=output)
+        self.assertIn('Warmed 5 keys with 5 requests', output.getvalue())
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/categories/')
+            self.client.get('/api/products/', {'category': 'bikes'})
+            self.client.get('/api/products/road-bike/')
+
+    def test_startup_warm_uses_the_request_host(self):
+        request_started.connect(warm_on_first_request, dispatch_uid='products.warm_on_first_request')
+        with self.settings(CATALOG_WARM_OPTIONS={'workers': 2}), \
+                mock.patch('products.apps.threading.Thread') as thread:
+            request_started.send(sender=None, environ={'HTTP_HOST': 'shop.example.com'})
+        self.assertEqual(thread.call_args.kwargs['kwargs'], {'workers': 2, 'host': 'shop.example.com'})
+
+    def test_host_is_required(self):
+        with self.assertRaisesMessage(CommandError, "CATALOG_WARM_OPTIONS['host']"):
+            call_command('warm_catalog_cache', stdout=StringIO())
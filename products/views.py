@@ -1,25 +1,146 @@
-from rest_framework import viewsets, permissions, filters, status
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import viewsets, permissions
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.cache import cache
 from django.conf import settings
 from django.utils.decorators import method_decorator         
-from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_cookie
-from django.db.models import Q
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.http import Http404
 from .models import Category, Product
 from .serializers import CategorySerializer, ProductSerializer
-from .filters import ProductFilter
+from .filters import ProductFilter, ProductSearchFilter, RankedOrderingFilter
+from .cache import (
+    CATEGORY_NAMESPACE, PRODUCT_NAMESPACE, forget_slug, get_generation, get_last_modified, get_or_fill,
+    get_slug_id, remember_slug,
+)
 from django.views.decorators.csrf import csrf_exempt
+from ecommerce_project.pagination import CursorPaginationMixin, attach_links, detach_links, paging_params
+from ecommerce_project.sparse_fields import SparseFieldsetViewMixin
+from ecommerce_project.values_serializers import ValuesSerializer
 # Cache TTL in seconds
 CACHE_TTL = getattr(settings, 'CACHE_TTL', 60 * 60)  # Default 1 hour
+# How long clients and shared caches may reuse a catalog response
+CATALOG_CACHE_MAX_AGE = getattr(settings, 'CATALOG_CACHE_MAX_AGE', 60)
+
+BOOLEAN_FILTER_VALUES = {'true': 'true', '1': 'true', 'false': 'false', '0': 'false'}
+
+
+def _normalize_filter_value(name, value):
+    """Canonical form of a ProductFilter value for cache keys"""
+    if name in ('min_price', 'max_price'):
+        try:
+            return str(Decimal(value).normalize())
+        except InvalidOperation:
+            return value
+    if name == 'in_stock':
+        return BOOLEAN_FILTER_VALUES.get(value.lower(), value)
+    return value
+
+def serialize_list(view, rows, fast):
+    """Serialize listing rows with the values() fast path when one is available"""
+    if fast is not None:
+        return fast.serialize(rows)
+    return view.get_serializer(rows, many=True).data
+
+class ConditionalCatalogMixin:
+    """Conditional GET (ETag / Last-Modified / 304) for catalog reads.
+    
+    Validators are derived from the catalog generation and the time it was
+    last bumped, so answering a revalidation costs two cache reads: no query
+    and no serialization. A stale body served while another process refills
+    the cache does not match them, so it goes out with no validators and
+    ``no-store``.
+    """
+    cache_namespace = None
+    conditional_actions = ('list', 'retrieve')
+    served_stale = False
+    
+    def get_etag_parts(self, request):
+        """Request details, besides the generation, that shape the response"""
+        return [request.get_host(), self.get_sparse_fields_signature(), self.kwargs.get(self.lookup_field)]
+    
+    def get_conditional_validators(self, request):
+        """Return the (ETag, Last-Modified timestamp) of this response"""
+        if not hasattr(self, '_conditional_validators'):
+            parts = [
+                self.cache_namespace, get_generation(self.cache_namespace), self.action,
+                request.accepted_renderer.format, *self.get_etag_parts(request),
+            ]
+            digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+            self._conditional_validators = (f'"{digest}"', get_last_modified(self.cache_namespace))
+        return self._conditional_validators
+    
+    def mark_served_stale(self):
+        """Called by get_or_fill() when the body predates the current generation"""
+        self.served_stale = True
+    
+    def not_modified_response(self, request):
+        """Return a 304 (or 412) response when the client's copy is current"""
+        etag, last_modified = self.get_conditional_validators(request)
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+    
+    def get_cached_detail(self):
+        """Return the detail payload for the slug in the URL.
+        
+        The cache key needs the object's id; it comes from the cached
+        slug -> id mapping, so a cache hit costs no query. Fills go through
+        ``get_object()``, keeping its 404 and object permission checks, and
+        repair stale mappings; so does a hit whose payload has another slug.
+        """
+        slug = self.kwargs[self.lookup_field]
+        instance = None
+        pk = get_slug_id(self.cache_namespace, slug)
+        if pk is None:
+            instance = self.get_object()
+            pk = instance.pk
+            remember_slug(self.cache_namespace, slug, pk)
+        
+        def fill():
+            obj = instance
+            if obj is None:
+                try:
+                    obj = self.get_object()
+                except Http404:
+                    forget_slug(self.cache_namespace, slug)
+                    raise
+                if obj.pk != pk:
+                    remember_slug(self.cache_namespace, slug, obj.pk)
+            return self.get_serializer(obj).data
+        
+        parts = ['detail', pk, self.get_sparse_fields_signature()]
+        data = get_or_fill(self.cache_namespace, parts, fill, CACHE_TTL, on_stale=self.mark_served_stale)
+        if instance is None and data.get(self.lookup_field, slug) != slug:
+            # Renamed without save() (a bulk update): the mapping is stale
+            forget_slug(self.cache_namespace, slug)
+            return self.get_cached_detail()
+        return data
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action not in self.conditional_actions:
+            return response
+        if self.served_stale:
+            patch_cache_control(response, no_store=True)
+        elif response.status_code in (200, 304):
+            etag, last_modified = self.get_conditional_validators(request)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, public=True, max_age=CATALOG_CACHE_MAX_AGE)
+            patch_vary_headers(response, ['Accept'])
+        return response
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalCatalogMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Category instances."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAdminUser]
     lookup_field = 'slug'
+    cache_namespace = CATEGORY_NAMESPACE
     
     def get_permissions(self):
         """Allow anyone to list and retrieve, but only admin to create, update, delete"""
@@ -31,46 +152,44 @@ class CategoryViewSet(viewsets.ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         """Override list method to use caching"""
-        # Try to get from cache
-        cache_key = 'category_list'
-        cached_data = cache.get(cache_key)
+        not_modified = self.not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
         
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        # If not in cache, get from DB
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        cache.set(cache_key, serializer.data, CACHE_TTL)
+        def fill():
+            queryset = self.filter_queryset(self.get_queryset())
+            fast = ValuesSerializer.for_serializer(self.get_serializer())
+            if fast is not None:
+                queryset = fast.project(queryset)
+            return serialize_list(self, queryset, fast)
         
-        return Response(serializer.data)
+        data = get_or_fill(
+            CATEGORY_NAMESPACE, ['list', self.get_sparse_fields_signature()], fill, CACHE_TTL,
+            on_stale=self.mark_served_stale,
+        )
+        return Response(data)
     
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve method to use caching"""
-        instance = self.get_object()
-        cache_key = f'category_{instance.id}'
-        cached_data = cache.get(cache_key)
+        not_modified = self.not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
         
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        serializer = self.get_serializer(instance)
-        cache.set(cache_key, serializer.data, CACHE_TTL)
-        
-        return Response(serializer.data)
+        return Response(self.get_cached_detail())
     
 @method_decorator(csrf_exempt, name='dispatch')   
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalCatalogMixin, SparseFieldsetViewMixin, CursorPaginationMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Product instances."""
     queryset = Product.objects.select_related('category').all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAdminUser]
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, RankedOrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['name', 'description', 'category__name']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['name']
+    cache_namespace = PRODUCT_NAMESPACE
     
     def get_permissions(self):
         """Allow anyone to list and retrieve, but only admin to create, update, delete"""
@@ -81,46 +200,81 @@ class ProductViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def list(self, request, *args, **kwargs):
-        """Override list to use caching, but skip if filters are applied"""
-        # Skip cache if filters are applied
-        if len(request.query_params) > 0:
+        """Override list to cache every filter, search, ordering and page variant"""
+        not_modified = self.not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+        
+        def fill():
             queryset = self.filter_queryset(self.get_queryset())
+            fast = ValuesSerializer.for_serializer(self.get_serializer())
+            if fast is not None:
+                queryset = fast.project(queryset)
             page = self.paginate_queryset(queryset)
             if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+                data = self.get_paginated_response(serialize_list(self, page, fast)).data
+                # Cached for every equivalent query: links are rebuilt per request
+                return detach_links(data, paging_params(self.paginator))
+            return serialize_list(self, queryset, fast)
         
-        # Try to get from cache
-        cache_key = 'product_list'
-        cached_data = cache.get(cache_key)
+        data = get_or_fill(
+            PRODUCT_NAMESPACE, ['list', self.get_list_cache_signature(request)], fill, CACHE_TTL,
+            stats_name='product_list', on_stale=self.mark_served_stale,
+        )
+        return Response(attach_links(data, request))
+    
+    def get_etag_parts(self, request):
+        if self.action == 'list':
+            return [self.get_list_cache_signature(request)]
+        return super().get_etag_parts(request)
+    
+    def get_list_cache_signature(self, request):
+        """Return a digest of the query parameters that shape a product listing.
+        
+        Parameters are normalized so that equivalent queries (reordered
+        parameters, ``10`` vs ``10.00``, search term casing) share a cache
+        entry, and parameters the listing ignores do not fragment the cache.
+        """
+        params = request.query_params
+        normalized = {'host': request.get_host()}
+        
+        for name in self.filterset_class.base_filters:
+            value = params.get(name, '').strip()
+            if value:
+                normalized[name] = _normalize_filter_value(name, value)
         
-        if cached_data is not None:
-            return Response(cached_data)
+        search_param = api_settings.SEARCH_PARAM
+        terms = params.get(search_param, '').replace(',', ' ').lower().split()
+        if terms:
+            normalized[search_param] = ' '.join(terms)
         
-        # If not in cache, get from DB
-        queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        ordering_param = api_settings.ORDERING_PARAM
+        ordering = [field.strip() for field in params.get(ordering_param, '').split(',') if field.strip()]
+        if ordering:
+            normalized[ordering_param] = ','.join(ordering)
         
-        serializer = self.get_serializer(queryset, many=True)
-        cache.set(cache_key, serializer.data, CACHE_TTL)
+        paginator = self.paginator
+        if paginator is not None:
+            normalized['pagination'] = type(paginator).__name__
+            page_param = getattr(paginator, 'page_query_param', None)
+            if page_param:
+                normalized[page_param] = params.get(page_param, '1').strip() or '1'
+            for attr in ('cursor_query_param', 'count_query_param'):
+                param = getattr(paginator, attr, None)
+                if param and params.get(param):
+                    normalized[param] = params[param].strip()
         
-        return Response(serializer.data)
+        kept_fields = self.get_sparse_fields()
+        if kept_fields is not None:
+            normalized['fields'] = kept_fields
+        
+        canonical = json.dumps(normalized, sort_keys=True)
+        return hashlib.md5(canonical.encode()).hexdigest()
     
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve method to use caching"""
-        instance = self.get_object()
-        cache_key = f'product_{instance.id}'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        serializer = self.get_serializer(instance)
-        cache.set(cache_key, serializer.data, CACHE_TTL)
+        not_modified = self.not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
         
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(self.get_cached_detail())
\ No newline at end of file
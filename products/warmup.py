@@ -0,0 +1,103 @@
+"""Catalog cache warm-up.
+
+Replays the reads that miss together after a deploy or a cache flush (the
+category list, category pages, the best-selling product pages and the first
+pages of every category listing) through the real viewsets, so the warmed
+entries are byte-for-byte the ones clients will ask for.
+
+The Host header is part of the cached list keys, so warming must use the
+host clients use: ``CATALOG_WARM_OPTIONS['host']`` unless one is given.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models import Count, Sum
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory
+
+from .cache import get_fill_count
+from .models import Category, Product
+
+
+
+def get_warm_host(host=None):
+    """Return ``host``, or the configured warm-up host"""
+    host = host or getattr(settings, 'CATALOG_WARM_OPTIONS', {}).get('host')
+    if not host:
+        raise ImproperlyConfigured(
+            "Set CATALOG_WARM_OPTIONS['host'] to the Host header clients use; it is part of the cache keys."
+        )
+    return host
+
+
+def top_product_slugs(limit):
+    """Slugs of the ``limit`` best-selling products, topped up with the newest ones"""
+    slugs = list(
+        Product.objects.annotate(sold=Sum('orderitem__quantity'))
+        .filter(sold__gt=0)
+        .order_by('-sold', 'id')
+        .values_list('slug', flat=True)[:limit]
+    )
+    if len(slugs) < limit:
+        newest = Product.objects.exclude(slug__in=slugs).order_by('-created_at', '-id')
+        slugs += list(newest.values_list('slug', flat=True)[:limit - len(slugs)])
+    return slugs
+
+
+def warm_targets(top_products=100, pages=1):
+    """Return the ``(path, query params)`` reads to precompute"""
+    targets = [('/api/products/categories/', {})]
+    categories = list(
+        Category.objects.annotate(product_count=Count('products'))
+        .order_by('-product_count', 'name')
+        .values_list('slug', flat=True)
+    )
+    targets += [(f'/api/products/categories/{slug}/', {}) for slug in categories]
+    for page in range(1, pages + 1):
+        targets.append(('/api/products/', {'page': page} if page > 1 else {}))
+        for slug in categories:
+            params = {'category': slug}
+            if page > 1:
+                params['page'] = page
+            targets.append(('/api/products/', params))
+    targets += [(f'/api/products/{slug}/', {}) for slug in top_product_slugs(top_products)]
+    return targets
+
+
+def warm_paths(targets, host, workers=8):
+    """Fetch ``(path, query params)`` targets through their views; return the status codes"""
+    factory = APIRequestFactory()
+
+    def fetch(target):
+        path, params = target
+        match = resolve(path)
+        try:
+            response = match.func(factory.get(path, params, HTTP_HOST=host), *match.args, **match.kwargs)
+            return response.status_code
+        finally:
+            # Worker threads open their own connections
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, targets))
+
+
+def warm_catalog(top_products=100, pages=1, workers=8, host=None):
+    """Precompute the catalog cache and return a summary of the run"""
+    host = get_warm_host(host)
+    targets = warm_targets(top_products=top_products, pages=pages)
+
+    fills_before = get_fill_count()
+    start = time.monotonic()
+    statuses = warm_paths(targets, host, workers=workers)
+    elapsed = time.monotonic() - start
+
+    return {
+        'requests': len(targets),
+        'failed': sum(1 for status in statuses if status != 200),
+        'keys_written': get_fill_count() - fills_before,
+        'seconds': round(elapsed, 3),
+    }
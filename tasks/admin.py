@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Task
+# Register your models here.
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'name']
+    search_fields = ['idempotency_key']
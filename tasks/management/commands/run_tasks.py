@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.queue import purge_done, run_pending
+
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks, polling for new ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due, then exit')
+        parser.add_argument('--batch-size', type=int, default=100, help='Tasks to run between connection checks')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle')
+        parser.add_argument(
+            '--retention-days', type=int, default=getattr(settings, 'TASKS_RETENTION_DAYS', 7),
+            help='Delete tasks that finished this many days ago (checked hourly)',
+        )
+
+    def handle(self, *args, **options):
+        next_purge = 0.0
+        while True:
+            close_old_connections()
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + PURGE_INTERVAL
+                purged = purge_done(options['retention_days'])
+                if purged:
+                    self.stdout.write(f'Purged {purged} finished task(s).')
+
+            succeeded, failed = run_pending(limit=options['batch_size'])
+            if succeeded or failed or options['once']:
+                self.stdout.write(self.style.SUCCESS(f'Ran {succeeded} task(s), {failed} failed.'))
+            if options['once']:
+                if succeeded + failed < options['batch_size']:
+                    return
+            elif not succeeded and not failed:
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,137 @@
+"""Background task queue backed by the ``Task`` table.
+
+Deferrable side effects are registered with ``@task`` in an app's
+``tasks.py`` and queued with ``enqueue()``. The row is inserted in the
+caller's transaction, so a task exists exactly when the write that asked
+for it committed. Workers (``manage.py run_tasks``) claim due rows with a
+conditional UPDATE, so several of them can share the table:
+
+* a failing task is retried with exponential backoff up to ``max_attempts``;
+* a claimed task holds a lease of ``TASKS_LEASE_SECONDS``; if its worker dies
+  it becomes due again once the lease runs out;
+* ``enqueue()`` with an ``idempotency_key`` that was already used is a no-op,
+  so a repeated request does not repeat the side effect (for as long as the
+  finished task is kept, ``TASKS_RETENTION_DAYS``).
+
+Task functions get the JSON payload as keyword arguments and run in a
+transaction. Delivery is at least once, so they must be safe to repeat.
+"""
+import logging
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = getattr(settings, 'TASKS_LEASE_SECONDS', 5 * 60)
+
+TaskSpec = namedtuple('TaskSpec', ['func', 'max_attempts', 'retry_delay'])
+
+# Task name -> TaskSpec
+registry = {}
+
+
+def task(name, max_attempts=3, retry_delay=10):
+    """Register the decorated function as background task ``name``.
+
+    Failed runs are retried after ``retry_delay`` seconds, doubling each time.
+    """
+    def decorator(func):
+        registry[name] = TaskSpec(func, max_attempts, retry_delay)
+        func.task_name = name
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, idempotency_key=None, delay=0):
+    """Queue task ``name`` to run in ``delay`` seconds with ``payload`` as arguments"""
+    spec = registry.get(name)
+    if spec is None:
+        raise LookupError(f'No task registered as {name!r}')
+    # One INSERT, ignored if the idempotency key is taken
+    Task.objects.bulk_create([Task(
+        name=name,
+        payload=payload or {},
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=spec.max_attempts,
+        idempotency_key=idempotency_key,
+    )], ignore_conflicts=idempotency_key is not None)
+
+
+def _due(now):
+    # Pending tasks whose time came, and running ones whose lease expired
+    return Q(status__in=[Task.PENDING, Task.RUNNING], run_after__lte=now)
+
+
+def claim_next():
+    """Lease the next due task to this worker and return it, or None"""
+    while True:
+        now = timezone.now()
+        task_id = Task.objects.filter(_due(now)).order_by('run_after', 'id').values_list('id', flat=True).first()
+        if task_id is None:
+            return None
+        claimed = Task.objects.filter(_due(now), pk=task_id).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            run_after=now + timedelta(seconds=LEASE_SECONDS),
+            updated_at=now,
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+        # Another worker claimed it first
+
+
+def execute(queued):
+    """Run a claimed task and record the outcome; return True on success"""
+    spec = registry.get(queued.name)
+    try:
+        if spec is None:
+            raise LookupError(f'No task registered as {queued.name!r}')
+        with transaction.atomic():
+            spec.func(**queued.payload)
+    except Exception:
+        logger.exception('Task %s failed (attempt %d of %d)', queued, queued.attempts, queued.max_attempts)
+        queued.last_error = traceback.format_exc()
+        if spec is None or queued.attempts >= queued.max_attempts:
+            queued.status = Task.FAILED
+        else:
+            queued.status = Task.PENDING
+            backoff = spec.retry_delay * 2 ** (queued.attempts - 1)
+            queued.run_after = timezone.now() + timedelta(seconds=backoff)
+        queued.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+        return False
+    queued.status = Task.DONE
+    queued.save(update_fields=['status', 'updated_at'])
+    return True
+
+
+def run_pending(limit=None):
+    """Run due tasks until none are left (or ``limit`` ran); return ``(succeeded, failed)``"""
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        queued = claim_next()
+        if queued is None:
+            break
+        if execute(queued):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def purge_done(days):
+    """Delete tasks that finished more than ``days`` ago; return how many.
+
+    Their idempotency keys can be used again afterwards. Failed tasks are
+    kept for inspection.
+    """
+    # A finished task's run_after is its last lease expiry, close to when it ran
+    cutoff = timezone.now() - timedelta(days=days)
+    return Task.objects.filter(status=Task.DONE, run_after__lt=cutoff).delete()[0]
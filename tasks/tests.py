@@ -0,0 +1,84 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Task
+from .queue import claim_next, enqueue, purge_done, registry, run_pending, task
+
+calls = []
+
+
+@task('tests.record', max_attempts=2, retry_delay=30)
+def record(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise ValueError(value)
+
+
+class TaskQueueTests(TestCase):
+    """Tasks run once per idempotency key, retry with backoff and survive dead workers"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_idempotency_key_queues_once(self):
+        enqueue('tests.record', {'value': 'a'}, idempotency_key='record:a')
+        enqueue('tests.record', {'value': 'a'}, idempotency_key='record:a')
+        enqueue('tests.record', {'value': 'b'})
+        self.assertEqual(run_pending(), (2, 0))
+        self.assertEqual(sorted(calls), ['a', 'b'])
+        self.assertEqual(set(Task.objects.values_list('status', flat=True)), {Task.DONE})
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(LookupError):
+            enqueue('tests.missing')
+
+    def test_failures_back_off_then_fail(self):
+        enqueue('tests.record', {'value': 'x', 'fail': True})
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertEqual(run_pending(), (0, 1))
+        queued = Task.objects.get()
+        self.assertEqual((queued.status, queued.attempts), (Task.PENDING, 1))
+        self.assertGreater(queued.run_after, timezone.now() + timedelta(seconds=25))
+        self.assertIn('ValueError: x', queued.last_error)
+
+        # Not due yet
+        self.assertEqual(run_pending(), (0, 0))
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertEqual(run_pending(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.FAILED, 2))
+        self.assertEqual(calls, ['x', 'x'])
+
+    def test_expired_lease_is_claimed_again(self):
+        enqueue('tests.record', {'value': 'y'})
+        claimed = claim_next()
+        self.assertEqual(claimed.status, Task.RUNNING)
+        # The claiming worker died; nothing is due until its lease runs out
+        self.assertIsNone(claim_next())
+        Task.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    def test_purge_keeps_recent_and_failed_tasks(self):
+        for value in ('old', 'new'):
+            enqueue('tests.record', {'value': value})
+        run_pending()
+        Task.objects.filter(payload__value='old').update(run_after=timezone.now() - timedelta(days=8))
+        Task.objects.create(name='tests.record', status=Task.FAILED, run_after=timezone.now() - timedelta(days=8))
+        self.assertEqual(purge_done(7), 1)
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_run_tasks_once(self):
+        enqueue('tests.record', {'value': 'z'})
+        output = StringIO()
+        call_command('run_tasks', '--once', stdout=output)
+        self.assertIn('Ran 1 task(s), 0 failed.', output.getvalue())
+        self.assertEqual(calls, ['z'])
+
+    def test_app_hooks_are_registered(self):
+        self.assertTrue({'orders.order_placed', 'products.reindex_category', 'products.refresh_catalog'} <= set(registry))
@@ -0,0 +1,35 @@
+"""Stateless JWT authentication for the hot authenticated endpoints.
+
+``StatelessJWTAuthentication`` trusts the ``user_id`` and ``is_staff`` claims
+of the access token instead of loading the user row on every request. The
+user it returns has only ``id``, ``is_active`` and ``is_staff`` loaded; other
+fields are fetched from the database the first time a view reads them.
+
+Tokens without the staff claim, and tokens issued before the user was last
+deactivated or had their staff flag changed (``User.principal_changed_at``,
+see ``users.principal``), go through the regular database-backed check.
+"""
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .principal import STAFF_CLAIM, build_principal, principal_changed_since
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication building the user principal from token claims"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        is_staff = validated_token.get(STAFF_CLAIM)
+        if (
+            is_staff is None
+            or api_settings.CHECK_REVOKE_TOKEN
+            or principal_changed_since(user_id, validated_token.get('iat'))
+        ):
+            return super().get_user(validated_token)
+        return build_principal(user_id, True, bool(is_staff))
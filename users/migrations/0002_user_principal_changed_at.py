@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 21:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='principal_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,8 +1,36 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+    """QuerySet that revokes token claims on bulk principal changes.
+    
+    ``update(is_active=...)`` or ``update(is_staff=...)`` (and so
+    ``bulk_update()`` of those fields) skips the save signals, so it stamps
+    ``principal_changed_at`` itself and drops the cached principals.
+    """
+    
+    def update(self, **kwargs):
+        if not {'is_active', 'is_staff'} & kwargs.keys():
+            return super().update(**kwargs)
+        from .principal import forget_changed_principals
+        
+        changed_at = kwargs.setdefault('principal_changed_at', timezone.now())
+        rows = super().update(**kwargs)
+        if rows:
+            user_ids = list(
+                self.model._base_manager.using(self.db)
+                .filter(principal_changed_at=changed_at).values_list('pk', flat=True)
+            )
+            forget_changed_principals(user_ids)
+            # Readers before the commit still see the old rows
+            transaction.on_commit(lambda: forget_changed_principals(user_ids), using=self.db)
+        return rows
+    
+    update.alters_data = True
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     
     
     def _create_user(self, email, password=None, **extra_fields):
@@ -42,11 +70,20 @@ class User(AbstractUser):
     state = models.CharField(max_length=100, blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
     postal_code = models.CharField(max_length=20, blank=True, null=True)
+    # Last deactivation, staff change or similar; older token claims are not trusted
+    principal_changed_at = models.DateTimeField(blank=True, null=True, editable=False)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
     
     objects = UserManager()
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Principal as stored, so token claims can be invalidated on real changes
+        instance._loaded_principal = (instance.__dict__.get('is_active'), instance.__dict__.get('is_staff'))
+        return instance
+    
     def __str__(self):
         return self.email
\ No newline at end of file
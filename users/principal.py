@@ -0,0 +1,202 @@
+"""Minimal user principals for high-volume authentication paths.
+
+Authentication only needs to know who the user is and whether they are
+active or staff. ``aget_principal`` answers that from a short-lived
+in-process cache, then from the shared cache, and only queries the
+database on a miss, so a storm of WebSocket reconnects costs close to zero
+queries. The returned ``User`` carries only ``id``, ``is_active`` and
+``is_staff``; any other field is loaded on first access.
+
+Entries are dropped when the user is saved or deleted, by moving the user
+to a new cache key version (like the catalog generations), so a load that
+read the row before the change cannot write the old values back. Other
+processes notice within ``USER_PRINCIPAL_LOCAL_TTL`` seconds.
+
+Access tokens also carry ``is_staff`` (``STAFF_CLAIM``) so REST requests can
+skip the lookup entirely (see ``users.authentication``). When a user is
+deactivated, promoted, demoted or deleted, the time of the change is stored
+in ``User.principal_changed_at`` (bulk ``update()`` calls included, see
+``UserQuerySet``), and tokens issued before it are checked against the
+database again. The shared cache only fronts that column: a lost or evicted
+entry is read back from the database and kept for
+``USER_PRINCIPAL_LOCAL_TTL`` seconds, which also bounds how long another
+process with a per-process cache can miss a change.
+"""
+import asyncio
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+LOCAL_TTL = getattr(settings, 'USER_PRINCIPAL_LOCAL_TTL', 30)
+SHARED_TTL = getattr(settings, 'USER_PRINCIPAL_CACHE_TTL', 5 * 60)
+LOCAL_MAX_ENTRIES = 10000
+
+PRINCIPAL_FIELDS = ('id', 'is_active', 'is_staff')
+STAFF_CLAIM = 'is_staff'
+
+# Cached value for ids with no user, so bogus tokens do not reach the database
+_MISSING_USER = 0
+
+# user id -> (expires at, principal fields or _MISSING_USER)
+_local = {}
+# user id -> future of a load in progress, shared by concurrent handshakes
+_inflight = {}
+# Bumped by forget_principal(); loads started before a bump are not kept locally
+_forget_count = 0
+
+
+def _version_key(user_id):
+    return f'user_principal_version_{user_id}'
+
+
+def _cache_key(user_id):
+    """Key of the user's principal under its current version"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Missing (never set, expired or evicted): seed from the clock so the
+        # key never matches one written under an older version
+        cache.add(key, time.time_ns(), SHARED_TTL)
+        version = cache.get(key)
+    return f'user_principal_{user_id}_v{version}'
+
+
+def _changed_key(user_id):
+    return f'user_principal_changed_{user_id}'
+
+
+def build_principal(user_id, is_active, is_staff):
+    """Return a User with only the principal fields loaded"""
+    User = get_user_model()
+    loaded = {'id': user_id, 'is_active': is_active, 'is_staff': is_staff}
+    # from_db expects values in model field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+    return User.from_db(router.db_for_read(User), names, [loaded[name] for name in names])
+
+
+def load_principal_fields(user_id):
+    """Return ``(id, is_active, is_staff)`` for a user, or None; shared cache first"""
+    # Taken before the query: if the user changes meanwhile, the set below
+    # lands on a key nobody reads any more
+    key = _cache_key(user_id)
+    fields = cache.get(key)
+    if fields is None:
+        row = get_user_model().objects.filter(pk=user_id).values_list(*PRINCIPAL_FIELDS).first()
+        fields = tuple(row) if row is not None else _MISSING_USER
+        cache.set(key, fields, SHARED_TTL)
+    return fields or None
+
+
+# Run loads in the default executor, not the single thread-sensitive one, so
+# a reconnect storm is served in parallel
+_aload_principal_fields = database_sync_to_async(load_principal_fields, thread_sensitive=False)
+
+
+async def aget_principal(user_id):
+    """Return the active user with ``user_id`` as a minimal principal, or None"""
+    now = time.monotonic()
+    entry = _local.get(user_id)
+    if entry is not None and entry[0] > now:
+        fields = entry[1]
+    else:
+        forget_count = _forget_count
+        future = _inflight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(_aload_principal_fields(user_id))
+            _inflight[user_id] = future
+            future.add_done_callback(lambda _: _inflight.pop(user_id, None))
+        fields = await asyncio.shield(future) or _MISSING_USER
+        if forget_count == _forget_count:
+            if len(_local) >= LOCAL_MAX_ENTRIES:
+                _local.clear()
+            _local[user_id] = (now + LOCAL_TTL, fields)
+
+    if not fields or not fields[1]:
+        return None
+    return build_principal(*fields)
+
+
+def forget_principal(user_id):
+    """Drop the cached principal of a user, including loads still in flight"""
+    global _forget_count
+    _forget_count += 1
+    _local.pop(user_id, None)
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), SHARED_TTL)
+
+
+def mark_principal_changed(user_id, using=None):
+    """Stop trusting the principal claims of tokens issued until now; return the time"""
+    changed_at = timezone.now()
+    get_user_model()._base_manager.using(using).filter(pk=user_id).update(principal_changed_at=changed_at)
+    cache.set(_changed_key(user_id), changed_at.timestamp(), int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+    return changed_at
+
+
+def remember_principal_changed(user):
+    """Cache ``user.principal_changed_at`` from a freshly loaded user, sparing a lookup"""
+    changed_at = user.principal_changed_at
+    cache.add(_changed_key(user.pk), changed_at.timestamp() if changed_at else 0, LOCAL_TTL)
+
+
+def forget_changed_principals(user_ids):
+    """Drop cached principals and change times; they are read back from the database"""
+    for user_id in user_ids:
+        forget_principal(user_id)
+    cache.delete_many([_changed_key(user_id) for user_id in user_ids])
+
+
+def principal_changed_since(user_id, issued_at):
+    """Whether the user changed after a token issued at ``issued_at`` (epoch seconds)"""
+    key = _changed_key(user_id)
+    changed_at = cache.get(key)
+    if changed_at is None:
+        row = get_user_model()._base_manager.filter(pk=user_id).values_list('principal_changed_at').first()
+        if row is None:
+            # Deleted: every token predates that
+            changed_at = time.time()
+        else:
+            changed_at = row[0].timestamp() if row[0] else 0
+        cache.set(key, changed_at, LOCAL_TTL)
+    # "iat" has one-second resolution, so a token from the same second is stale too
+    return bool(changed_at) and (issued_at is None or issued_at <= changed_at)
+
+
+def _forget_after_commit(user_id, using):
+    forget_principal(user_id)
+    # Loads between now and the commit still read the old row
+    transaction.on_commit(lambda: forget_principal(user_id), using=using)
+
+
+def _forget_saved_user(sender, instance, created=False, using=None, **kwargs):
+    _forget_after_commit(instance.pk, using)
+    if created:
+        return
+    current = (instance.__dict__.get('is_active'), instance.__dict__.get('is_staff'))
+    loaded = getattr(instance, '_loaded_principal', None)
+    if loaded is None or any(
+        # Deferred fields were not saved
+        now is not None and now != before for now, before in zip(current, loaded)
+    ):
+        instance.principal_changed_at = mark_principal_changed(instance.pk, using)
+
+
+def _forget_deleted_user(sender, instance, using=None, **kwargs):
+    _forget_after_commit(instance.pk, using)
+    mark_principal_changed(instance.pk, using)
+
+
+def connect_signals():
+    User = get_user_model()
+    post_save.connect(_forget_saved_user, sender=User, dispatch_uid='users.principal.saved')
+    post_delete.connect(_forget_deleted_user, sender=User, dispatch_uid='users.principal.deleted')
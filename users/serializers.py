@@ -2,6 +2,11 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from ecommerce_project.sparse_fields import SparseFieldsetSerializerMixin
+from .principal import STAFF_CLAIM, load_principal_fields, remember_principal_changed
 
 User = get_user_model()
 
@@ -37,7 +42,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for user profile"""
     class Meta:
         model = User
@@ -54,4 +59,24 @@ class ChangePasswordSerializer(serializers.Serializer):
     def validate(self, attrs):
         if attrs['new_password'] != attrs['confirm_password']:
             raise serializers.ValidationError({"password": "Password fields didn't match."})
-        return attrs
\ No newline at end of file
+        return attrs
+
+class PrincipalTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair whose claims carry the user's staff flag"""
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[STAFF_CLAIM] = user.is_staff
+        # The user row is at hand: spare the first request the revocation lookup
+        remember_principal_changed(user)
+        return token
+
+class PrincipalTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that stamps the new access token with the current staff flag"""
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        fields = load_principal_fields(access[api_settings.USER_ID_CLAIM])
+        access[STAFF_CLAIM] = bool(fields and fields[2])
+        data['access'] = str(access)
+        return data
\ No newline at end of file
@@ -1,3 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import StatelessJWTAuthentication
+
+User = get_user_model()
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    """Token claims stand in for the user row until the principal changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='shopper@example.com', password='pass12345')
+        self.tokens = self.login()
+
+    def login(self):
+        response = self.client.post('/api/users/login/', {'email': 'shopper@example.com', 'password': 'pass12345'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def test_principal_is_built_without_queries(self):
+        self.assertIs(AccessToken(self.tokens['access'])['is_staff'], False)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(self.tokens['access'])
+            self.assertEqual((user.pk, user.is_active, user.is_staff), (self.user.pk, True, False))
+        # Other fields load on demand
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'shopper@example.com')
+
+    def test_order_requests_skip_the_user_fetch(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        self.client.get('/api/orders/orders/')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/orders/orders/').status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/orders/orders/', {'fields': 'summary'}).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.tokens['access'])
+
+    def test_staff_change_is_read_from_the_database(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.is_staff = True
+        user.save()
+        self.assertTrue(self.authenticate(self.tokens['access'])[0].is_staff)
+
+        # Refreshed access tokens carry the new flag
+        response = self.client.post('/api/users/token/refresh/', {'refresh': self.tokens['refresh']})
+        self.assertIs(AccessToken(response.data['access'])['is_staff'], True)
+
+    def test_unrelated_saves_keep_tokens_stateless(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.city = 'Lisbon'
+        user.save()
+        with self.assertNumQueries(0):
+            self.authenticate(self.tokens['access'])
+
+    def test_bulk_deactivation_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.tokens['access'])
+
+    def test_revocation_survives_losing_the_cache(self):
+        self.user.is_active = False
+        self.user.save()
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.tokens['access'])